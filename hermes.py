@@ -18,7 +18,7 @@ limitations under the License.
 from discord import Intents
 from dotenv import load_dotenv
 
-from src.database import connect_database
+from src.database import connect_database, close_database
 
 from src.tts import shutdown_worker
 
@@ -42,6 +42,7 @@ def main():
     # Start the bot
     bot.run(token)
     shutdown_worker()
+    close_database()
 
 
 if __name__ == "__main__":
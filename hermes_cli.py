@@ -0,0 +1,406 @@
+'''
+Copyright (c) 2021 Oliver Clarke.
+
+This file is part of HermesBot.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+from src.database import (DatabaseManager, DatabaseUpdate,
+                          LatencyHistogram, Migrator, check_plans,
+                          create_engine)
+from src.helpers import (GuildExporter, GuildRestorer, QuoteImporter,
+                         import_format, read_quotes)
+from src.tts.ttscache import TTS_PATH, cleanup_audio
+from src.tts.ttsengine import ENGINES, tts_engine
+from src.tts.ttsopus import encode_opus, has_opus
+from concurrent.futures import ThreadPoolExecutor
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+
+async def import_quotes(db, args):
+
+    fmt = args.format or import_format(args.file)
+
+    async def progress(importer):
+        print(f'Importing: {importer}')
+
+    with open(args.file, encoding='utf-8', newline='') as stream:
+        importer = QuoteImporter(db, args.guild,
+                                 batch_size=args.batch_size,
+                                 progress=progress)
+        await importer.run(read_quotes(stream, fmt))
+
+    print(f'Import finished: {importer}')
+
+    await backfill_tts(db)
+
+
+async def backfill_tts(db):
+    """
+    Queue TTS jobs for quotes without audio, for the bot to run.
+    """
+    after = await db.start_tts_backfill()
+    total = 0
+
+    while after is not None:
+        queued, after = await db.queue_missing_tts_jobs(after)
+        total += queued
+
+    print(f'{total} TTS jobs queued for the bot to run.')
+
+
+async def export_guild(db, args):
+
+    exporter = await GuildExporter(db, args.guild).run(args.output)
+    print(f'Export finished: {exporter}')
+
+
+async def restore_guild(db, args):
+
+    restorer = await GuildRestorer(db, args.guild).run(args.file)
+    print(f'Restore finished: {restorer}')
+
+    await backfill_tts(db)
+
+
+async def tts_cleanup(db, args):
+
+    removed, freed = await cleanup_audio(db, grace=args.grace,
+                                         dry_run=args.dry_run)
+
+    action = 'Would remove' if args.dry_run else 'Removed'
+    print(f'{action} {removed} unreferenced TTS files '
+          f'({freed / 1024 / 1024:.1f} MiB).')
+
+
+async def rebuild_stats(db, args):
+
+    started = time.perf_counter()
+    await db.rebuild_quote_stats(args.guild)
+
+    print(f'Quote stats rebuilt in {time.perf_counter() - started:.2f}s.')
+
+
+async def bench_statements(loop, args):
+    """
+    Time the hot read paths with plain text queries and with
+    server-side prepared statements.
+    """
+    calls = [
+        ('get_guild_settings', (args.guild,)),
+        ('get_quote_from_id', (args.guild, args.quote)),
+        ('get_id_tts', (args.quote,)),
+        ('get_guild_quote_count', (args.guild,)),
+    ]
+
+    # Imported here since the other commands do not need MySQL
+    from src.database.mysqlengine import MySQLEngine
+
+    for prepared in (False, True):
+        db = DatabaseManager(loop, engine=MySQLEngine(prepared=prepared))
+        mode = 'prepared' if prepared else 'text'
+
+        try:
+            for name, data in calls:
+                method = getattr(db, name)
+
+                # Warm up the pool (and prepare the statements)
+                for _ in range(10):
+                    await method(*data)
+
+                started = time.perf_counter()
+                for _ in range(args.iterations):
+                    await method(*data)
+                elapsed = time.perf_counter() - started
+
+                print(f'{mode:>8} {name:<24} '
+                      f'{elapsed / args.iterations * 1e6:9.1f} us/call '
+                      f'{args.iterations / elapsed:9.0f} calls/s')
+        finally:
+            db.close()
+
+
+def tts_encode(args):
+    """
+    Encode the Opus clips of TTS files which do not have them, such
+    as files made before clips were encoded.
+    """
+    names = [name[:-len('.mp3')] for name in os.listdir(TTS_PATH)
+             if name.endswith('.mp3')]
+    names = [name for name in names if not has_opus(name)]
+    failures = 0
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(encode_opus, name): name
+                   for name in names}
+
+        for future, name in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f'{name}: {e}')
+                failures += 1
+
+    print(f'Encoded {len(names) - failures} of {len(names)} TTS files.')
+    return failures
+
+
+def bench_tts(args):
+    """
+    Time synthesis alone, without the database or the TTS queue.
+    Every file is new text so nothing is reused.
+    """
+    engine = tts_engine(args.engine)
+    latency = LatencyHistogram()
+    failures = 0
+
+    def synthesize(directory, i):
+        started = time.perf_counter()
+        engine.synthesize(f'{args.text} {i}',
+                          os.path.join(directory, f'{i}.mp3'))
+        return time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory, \
+            ThreadPoolExecutor(max_workers=args.workers) as executor:
+        started = time.perf_counter()
+        futures = [executor.submit(synthesize, directory, i)
+                   for i in range(args.count)]
+
+        for future in futures:
+            try:
+                latency.record(future.result())
+            except Exception as e:
+                print(f'Synthesis failed: {e}')
+                failures += 1
+        elapsed = time.perf_counter() - started
+
+    summary = latency.summary()
+    print(f'{engine}: {summary["count"]} files, {failures} failed, '
+          f'{args.workers} workers')
+    print(f'latency p50 {summary["p50"]:.1f} ms, '
+          f'p95 {summary["p95"]:.1f} ms, p99 {summary["p99"]:.1f} ms, '
+          f'max {summary["max"]:.1f} ms')
+    print(f'throughput {summary["count"] / elapsed:.2f} files/s')
+
+    return failures
+
+
+def seed_database(engine, quotes, guilds=10, users=50):
+    """
+    Fill an empty database with generated users, quotes and TTS
+    file references.  Nine in ten quotes get a TTS file, the rest
+    a TTS job.
+    """
+    insert_user = engine.translate(DatabaseUpdate.INSERT_GUILD_USER)
+    insert_quote = engine.translate(DatabaseUpdate.INSERT_GUILD_QUOTE)
+    insert_tts = engine.translate(DatabaseUpdate.INSERT_TTS_FILE)
+
+    engine.executemany(insert_user, [
+        (guild, f'user_{user}')
+        for guild in range(1, guilds + 1) for user in range(users)])
+
+    # User ids are handed out in order, `users` per guild
+    engine.executemany(insert_quote, [
+        (i % guilds + 1, (i % guilds) * users + i % users + 1,
+         f'Generated quote number {i}', '2021-01-01 00:00:00')
+        for i in range(quotes)])
+
+    engine.executemany(insert_tts, [
+        (quote, f'{quote}') for quote in range(1, quotes + 1)
+        if quote % 10 != 0])
+
+    engine.execute_batch([
+        (engine.translate(DatabaseUpdate.COUNT_ALL_QUOTE_USER_STATS),
+         None, False),
+        (engine.translate(DatabaseUpdate.COUNT_ALL_QUOTE_MONTH_STATS),
+         None, False),
+        (engine.translate(DatabaseUpdate.INSERT_TTS_JOBS_MISSING),
+         ('2021-01-01 00:00:00', 0, quotes,), False)])
+
+
+def report_plans(engine, label, iterations=20):
+    """
+    Print the plan and average latency of every checked query.
+
+    :return: The number of queries with a problem
+    """
+    print(f'== {label}')
+    failures = 0
+
+    for check, steps, problems in check_plans(engine):
+        query = engine.translate(check.query)
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            engine.execute(query, check.data)
+        elapsed = (time.perf_counter() - started) / iterations
+
+        status = 'FAIL' if problems else 'ok'
+        print(f'{status:>4} {check.name:<28} {elapsed * 1000:8.3f} ms')
+        for step in steps:
+            print(f'       {step}')
+        for problem in problems:
+            print(f'       ! {problem}')
+
+        failures += len(problems) > 0
+    return failures
+
+
+def bench_plans(args):
+    """
+    Check that the catalogue queries keep using their indexes as
+    the tables grow.  SQLite runs against generated in-memory
+    databases of each size, MySQL against the configured database.
+    """
+    failures = 0
+
+    if args.engine == 'sqlite':
+        from src.database.sqliteengine import SQLiteEngine
+
+        for size in args.sizes:
+            engine = SQLiteEngine(':memory:')
+            try:
+                Migrator(engine).migrate()
+                seed_database(engine, size)
+                engine.execute('ANALYZE')
+                failures += report_plans(engine, f'sqlite, {size} quotes')
+            finally:
+                engine.close()
+    else:
+        engine = create_engine('mysql')
+        try:
+            failures += report_plans(engine, 'mysql, configured database')
+        finally:
+            engine.close()
+
+    return failures
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Offline maintenance tools for HermesBot.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    # Bulk quote import
+    importer = commands.add_parser(
+        'import', help='Import quotes from a csv or jsonl file.')
+    importer.add_argument('file')
+    importer.add_argument('--guild', type=int, required=True)
+    importer.add_argument('--format', choices=['csv', 'jsonl'])
+    importer.add_argument('--batch-size', type=int, default=1000)
+
+    # Text vs prepared statement benchmark
+    bench = commands.add_parser(
+        'bench-statements',
+        help='Compare plain text queries with prepared statements.')
+    bench.add_argument('--guild', type=int, required=True)
+    bench.add_argument('--quote', type=int, required=True)
+    bench.add_argument('--iterations', type=int, default=2000)
+
+    # Query plan benchmark
+    plans = commands.add_parser(
+        'bench-plans',
+        help='Check the query plans of the catalogue as tables grow.')
+    plans.add_argument('--engine', choices=['sqlite', 'mysql'],
+                       default='sqlite')
+    plans.add_argument('--sizes', type=int, nargs='+',
+                       default=[1000, 10000, 100000])
+
+    # TTS engine benchmark
+    tts = commands.add_parser(
+        'bench-tts', help='Time a TTS engine without the database.')
+    tts.add_argument('--engine', choices=list(ENGINES),
+                     help='Defaults to the TTS_ENGINE setting.')
+    tts.add_argument('--count', type=int, default=50)
+    tts.add_argument('--workers', type=int, default=4)
+    tts.add_argument('--text',
+                     default='The quick brown fox jumps over the lazy dog')
+
+    # Guild backups
+    export = commands.add_parser(
+        'export', help="Export a guild's quotes and TTS files.")
+    export.add_argument('--guild', type=int, required=True)
+    export.add_argument('--output', required=True,
+                        help='Archive to write, compressed if it ends in .gz')
+
+    restore = commands.add_parser(
+        'restore', help='Restore an exported archive into a guild.')
+    restore.add_argument('file')
+    restore.add_argument('--guild', type=int, required=True)
+
+    # Quote statistics
+    stats = commands.add_parser(
+        'rebuild-stats',
+        help='Recount the quote statistics from the quotes.')
+    stats.add_argument('--guild', type=int,
+                       help='Only rebuild one guild.')
+
+    # TTS file cleanup
+    cleanup = commands.add_parser(
+        'tts-cleanup', help='Remove TTS files no quote references.')
+    cleanup.add_argument('--grace', type=int, default=3600,
+                         help='Keep files changed within this many seconds.')
+    cleanup.add_argument('--dry-run', action='store_true')
+
+    encode = commands.add_parser(
+        'tts-encode', help='Encode Opus clips for TTS files without them.')
+    encode.add_argument('--workers', type=int, default=4)
+
+    # Schema migrations
+    commands.add_parser('migrate', help='Apply pending schema migrations.')
+
+    args = parser.parse_args()
+
+    if args.command == 'bench-plans':
+        sys.exit(1 if bench_plans(args) > 0 else 0)
+    if args.command == 'bench-tts':
+        sys.exit(1 if bench_tts(args) > 0 else 0)
+    if args.command == 'tts-encode':
+        sys.exit(1 if tts_encode(args) > 0 else 0)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    try:
+        if args.command == 'bench-statements':
+            loop.run_until_complete(bench_statements(loop, args))
+        else:
+            db = DatabaseManager(loop)
+            try:
+                Migrator(db.engine).migrate()
+
+                if args.command == 'import':
+                    loop.run_until_complete(import_quotes(db, args))
+                elif args.command == 'export':
+                    loop.run_until_complete(export_guild(db, args))
+                elif args.command == 'restore':
+                    loop.run_until_complete(restore_guild(db, args))
+                elif args.command == 'rebuild-stats':
+                    loop.run_until_complete(rebuild_stats(db, args))
+                elif args.command == 'tts-cleanup':
+                    loop.run_until_complete(tts_cleanup(db, args))
+            finally:
+                db.close()
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
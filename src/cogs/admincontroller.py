@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2021 Oliver Clarke.
+
+This file is part of HermesBot.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from discord.ext import commands
+
+from ..database import hermes_database
+from ..tts import tts_worker
+from ..utils import smart_print
+
+import discord
+import io
+import json
+
+
+class AdminController(commands.Cog):
+    """Commands for the owner of the bot."""
+
+    def __init__(self, bot):
+        """Initialize important information."""
+        self.bot = bot
+        self.db = hermes_database()
+
+    async def cog_check(self, ctx):
+        return await self.bot.is_owner(ctx.author)
+
+    @commands.command(
+        name='dbstats',
+        help='- optional [json] : Database latency and pool usage.'
+    )
+    async def database_stats(self, ctx, fmt=None):
+        snapshot = self.db.stats()
+
+        if fmt is not None and fmt.lower() == 'json':
+            data = json.dumps(snapshot, indent=2).encode('utf-8')
+            return await ctx.send(
+                file=discord.File(io.BytesIO(data), 'dbstats.json'))
+        elif fmt is not None:
+            return await smart_print(ctx, 'Unknown command. Check .help for command usage.')  # noqa
+
+        pool = snapshot['pool']
+        wait = pool['wait']
+        executor = snapshot['executor_wait']
+
+        embed = discord.Embed(
+            title='Database',
+            color=discord.Colour.dark_teal(),
+            description=(
+                f'Pool: **{pool["in_use"]}** in use of '
+                f'**{pool.get("open", pool["max_size"])}** open '
+                f'(max **{pool["max_size"]}**), '
+                f'peak **{pool["peak_in_use"]}**\n'
+                f'Checkout wait p50/p99: **{wait["p50"]:.2f}** / '
+                f'**{wait["p99"]:.2f}** ms\n'
+                f'Executor wait p50/p99: **{executor["p50"]:.2f}** / '
+                f'**{executor["p99"]:.2f}** ms'))
+
+        cache = snapshot['cache']
+        embed.add_field(
+            name='Cache',
+            value='\n'.join(
+                f'{name}: {stats["hit_rate"]:.0%} hits, '
+                f'{stats["size"]}/{stats["max_size"]} entries'
+                for name, stats in cache.items()),
+            inline=False)
+
+        replicas = snapshot.get('replicas', {})
+        if len(replicas) > 0:
+            embed.add_field(
+                name='Replicas',
+                value='\n'.join(
+                    f'{name}: {"up" if replica["healthy"] else "down"}'
+                    for name, replica in replicas.items()),
+                inline=False)
+
+        # Show the statements which take the most time overall
+        statements = sorted(snapshot['statements'].items(),
+                            key=lambda s: s[1]['mean'] * s[1]['count'],
+                            reverse=True)
+
+        for name, stats in statements[:10]:
+            embed.add_field(
+                name=name,
+                value=(f'{stats["count"]} calls\n'
+                       f'p50 {stats["p50"]:.2f} ms\n'
+                       f'p95 {stats["p95"]:.2f} ms\n'
+                       f'p99 {stats["p99"]:.2f} ms'))
+
+        await ctx.send(embed=embed)
+
+    @commands.command(
+        name='ttsstats',
+        help='- TTS queue depth and throughput.'
+    )
+    async def tts_stats(self, ctx):
+        worker = tts_worker()
+
+        if worker is None:
+            return await smart_print(ctx, 'The TTS worker is not running.')
+
+        stats = worker.stats()
+        await smart_print(ctx,
+                          'Queued: **%s** (%s interactive), in flight: **%s** '
+                          'of %s workers, waiting to store: **%s**\n'
+                          'Synthesized: **%s** (%s/s), reused: **%s**, '
+                          'failed: **%s**, retried: **%s**',
+                          data=[stats['queued'], stats['queued_interactive'],
+                                stats['in_flight'],
+                                stats['workers'], stats['waiting_to_store'],
+                                stats['synthesized'],
+                                f'{stats["rate"]:.2f}', stats['reused'],
+                                stats['failed'], stats['retried']])
+
+    @commands.command(
+        name='ttsdead',
+        help='- optional [retry <id:int> | retry all | clear] : TTS jobs which failed too often.'  # noqa
+    )
+    async def tts_dead_letters(self, ctx, command=None, quoteid=None):
+
+        if command is None:
+            waiting, dead = await self.db.get_tts_job_counts()
+            jobs = await self.db.get_dead_tts_jobs()
+
+            embed = discord.Embed(
+                title='TTS dead letters',
+                color=discord.Colour.dark_teal(),
+                description=(f'**{dead}** dead, **{waiting}** waiting '
+                             f'or being retried'))
+
+            for jobid, guildid, attempts, error in jobs:
+                embed.add_field(
+                    name=f'Quote {jobid} in {guildid}',
+                    value=f'{attempts} attempts\n{(error or "")[:200]}',
+                    inline=False)
+            return await ctx.send(embed=embed)
+
+        command = command.lower()
+
+        if command == 'retry' and quoteid is not None:
+            if quoteid.lower() == 'all':
+                revived = await self.db.revive_tts_jobs()
+            elif quoteid.isdigit():
+                revived = await self.db.revive_tts_jobs(int(quoteid))
+            else:
+                return await smart_print(ctx, 'Unknown command. Check .help for command usage.')  # noqa
+            return await smart_print(ctx, '**%s** TTS jobs will be retried.',
+                                     data=[revived])
+        elif command == 'clear':
+            cleared = await self.db.delete_dead_tts_jobs()
+            return await smart_print(ctx, '**%s** dead TTS jobs removed.',
+                                     data=[cleared])
+
+        return await smart_print(ctx, 'Unknown command. Check .help for command usage.')  # noqa
+
+
+def setup(bot):
+    bot.add_cog(AdminController(bot))
@@ -19,7 +19,7 @@ limitations under the License.
 
 from discord.ext import commands
 
-from ..helpers import AudioManager, GuildSettings
+from ..helpers import AudioManager, guild_settings_store
 from ..utils import smart_print
 
 import asyncio
@@ -203,7 +203,7 @@ class BotController(commands.Cog):
         if volume < 0 or volume > 100:
             return await smart_print(ctx, 'The volume needs to be in the range of 1-100.')  # noqa
 
-        await GuildSettings.save_music_volume(ctx.guild.id, volume/100)
+        await guild_settings_store().set_music_volume(ctx.guild.id, volume/100)
         await self.audio_manager.set_volume(ctx, volume)
 
     @commands.command(name='quote_volume', aliases=['qvol'],
@@ -213,7 +213,7 @@ class BotController(commands.Cog):
         if volume < 0 or volume > 100:
             return await smart_print(ctx, 'The volume needs to be in the range of 1-100.')  # noqa
 
-        await GuildSettings.save_quote_volume(ctx.guild.id, volume/100)
+        await guild_settings_store().set_quote_volume(ctx.guild.id, volume/100)
         await smart_print(ctx, 'Quote volume set to **%s%**', data=[volume])
 
 
@@ -52,7 +52,7 @@ class QuoteController(commands.Cog):
 
     @commands.command(
         name="quotes",
-        help="- [user <name:string> | id <id:int> | all <DANGER>]"
+        help="- [user <name:string> | id <id:int> | search <terms:string> | stats | all <DANGER> | import <file> | export | restore <file> | tts [<engine:string> | default]]"  # noqa
     )
     async def get_all_quotes(self, ctx, command=None, *, args=None):
 
@@ -69,8 +69,30 @@ class QuoteController(commands.Cog):
             if not args:
                 return await smart_print(ctx, 'Unknown command. Check .help for command usage.')  # noqa
             return await self.qm.get_quote_from_id(ctx, args)
+        elif command == 'search':
+            if not args:
+                return await smart_print(ctx, 'Unknown command. Check .help for command usage.')  # noqa
+            return await self.qm.search_quotes(ctx, args)
+        elif command == 'stats':
+            return await self.qm.get_quote_stats(ctx)
         elif command == 'all':
             return await self.qm.get_all_guild_quotes(ctx)
+        elif command == 'import':
+            if not ctx.author.guild_permissions.administrator:
+                return await smart_print(ctx, 'Only administrators can import quotes.')  # noqa
+            return await self.qm.import_quotes(ctx)
+        elif command == 'export':
+            if not ctx.author.guild_permissions.administrator:
+                return await smart_print(ctx, 'Only administrators can export quotes.')  # noqa
+            return await self.qm.export_quotes(ctx)
+        elif command == 'restore':
+            if not ctx.author.guild_permissions.administrator:
+                return await smart_print(ctx, 'Only administrators can restore quotes.')  # noqa
+            return await self.qm.restore_quotes(ctx)
+        elif command == 'tts':
+            if args and not ctx.author.guild_permissions.administrator:
+                return await smart_print(ctx, 'Only administrators can change the TTS engine.')  # noqa
+            return await self.qm.set_tts_engine(ctx, args)
         else:
             return await smart_print(ctx, 'Unknown command. Check .help for command usage.')  # noqa
 
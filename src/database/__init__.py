@@ -1,13 +1,30 @@
-from .databasemanager import (DatabaseManager,
-                              DatabaseQuery,
-                              DatabaseUpdate)
+from .batch import Batch, RowId
+from .cache import LRUCache, ResultCache
+from .databasemanager import DatabaseManager
+from .explain import PlanCheck, check_plans
+from .metrics import DatabaseMetrics, LatencyHistogram
+from .migrator import Migrator
+from .pool import ConnectionPool, PoolTimeoutError
+from .queries import (DatabaseQuery,
+                      DatabaseUpdate,
+                      statement_catalogue)
+from .replicas import Replica, ReplicaSet
+from .statements import PreparedStatements
+from .storageengine import (PlanStep,
+                            StorageEngine,
+                            create_engine,
+                            create_replicas)
 
 _DATABASE_HOLDER = {'db': None}
 
 
 def connect_database(bot):
     if _DATABASE_HOLDER['db'] is None:
-        _DATABASE_HOLDER['db'] = DatabaseManager(bot.loop)
+        db = DatabaseManager(bot.loop)
+
+        # Bring the schema up to date before anything uses it
+        Migrator(db.engine).migrate()
+        _DATABASE_HOLDER['db'] = db
     else:
         raise Exception(
               'Database has already been initalized.  This can only be done once!')  # noqa
@@ -20,10 +37,21 @@ def hermes_database():
     return _DATABASE_HOLDER['db']
 
 
+def close_database():
+    if _DATABASE_HOLDER['db'] is not None:
+        _DATABASE_HOLDER['db'].close()
+
+
 __all__ = [
     # Classes
-    'DatabaseManager', 'DatabaseQuery', 'DatabaseUpdate',
+    'Batch', 'DatabaseManager', 'DatabaseQuery', 'DatabaseUpdate',
+    'ConnectionPool', 'DatabaseMetrics', 'LatencyHistogram',
+    'LRUCache', 'Migrator', 'PlanCheck', 'PlanStep', 'PoolTimeoutError',
+    'PreparedStatements', 'Replica', 'ReplicaSet', 'ResultCache',
+    'RowId', 'StorageEngine',
 
     # Methods
-    'connect_database', 'hermes_database'
+    'connect_database', 'hermes_database', 'close_database',
+    'check_plans', 'create_engine', 'create_replicas',
+    'statement_catalogue'
 ]
@@ -0,0 +1,52 @@
+class RowId:
+    """
+    Stands in for the id of the row inserted by an earlier
+    statement in the same `Batch`.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+
+class Batch:
+    """
+    Statements to run together on one connection as one transaction.
+
+    Data may contain `RowId()` values, which are replaced with the
+    last row id of an earlier statement when the batch runs.
+
+        batch = Batch()
+        quote = batch.add(DatabaseUpdate.INSERT_GUILD_QUOTE, (...))
+        batch.add(DatabaseUpdate.INSERT_TTS_FILE, (quote, filename))
+        results = await db.run_batch(batch)
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def add(self, query, data=None):
+        """
+        :return: `RowId()` of the row this statement inserts
+        """
+        self.statements.append((query, data, False))
+        return RowId(len(self.statements) - 1)
+
+    def add_many(self, query, rows):
+        self.statements.append((query, rows, True))
+
+    def names(self, names):
+        return '+'.join(names.get(query, 'OTHER')
+                        for query, _, _ in self.statements)
+
+
+def resolve(data, results):
+    """
+    Replace the `RowId()` values in `data` with their row ids.
+    """
+    if data is None:
+        return None
+    return tuple(results[value.index] if isinstance(value, RowId) else value
+                 for value in data)
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+
+import threading
+import time
+
+
+class LRUCache:
+    """
+    A small least recently used cache.
+
+    Once `maxsize` entries are stored, adding another entry
+    evicts the entry which has gone the longest without
+    being read or written.
+
+    Thread-safe, since the database manager is shared by the bot's
+    loop and the TTS thread's.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Returned by `ResultCache.get()` on a miss, since `None`
+# and `[]` are results worth caching.
+MISSING = object()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of query results which expire after
+    `ttl` seconds.
+
+    Like `UserDirectory`, a result fetched before an invalidation
+    is not stored, so an invalidated entry is never brought back
+    by a query which was already running.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.ttl = ttl
+        self._entries = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def version(self):
+        return self._version
+
+    def get(self, key):
+        """
+        :return: The cached result or `MISSING`
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                expires, value = entry
+                if time.monotonic() < expires:
+                    self.hits += 1
+                    return value
+
+                self._entries.pop(key)
+                self.expired += 1
+
+            self.misses += 1
+            return MISSING
+
+    def put(self, key, value, version):
+        """
+        :param version: value of `version()` before the result was fetched
+        """
+        with self._lock:
+            if version == self._version:
+                self._entries.put(key, (time.monotonic() + self.ttl, value))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._version += 1
+            self._entries.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self._entries.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            }
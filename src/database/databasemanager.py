@@ -1,156 +1,358 @@
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
-from mysql.connector import pooling
-from mysql.connector.errors import InterfaceError
-import os
+from .batch import Batch
+from .cache import MISSING, ResultCache
+from .metrics import DatabaseMetrics
+from .queries import DatabaseQuery, DatabaseUpdate, statement_names
+from .storageengine import create_engine, create_replicas
+from .userdirectory import UserDirectory
+import asyncio
+import collections
 import datetime
+import os
+import random
+import threading
+import time
 
+# Statement names used to label timings
+STATEMENT_NAMES = statement_names()
 
-class DatabaseQuery:
+# Seconds after a write during which a guild's reads stay on the
+# primary, which must be longer than the replicas lag behind it.
+REPLICA_LAG = 5
 
-    SELECT_GUILD_SETTINGS = 'SELECT * FROM guild_settings WHERE idguild=%s'
-    SELECT_GUILD_USERS = 'SELECT * FROM users WHERE idguild=%s'
+# Bounds of the quote and TTS lookup caches, entries and seconds
+CACHE_SIZE = 1024
+CACHE_TTL = 300
 
-    SELECT_QUOTES_GUILD = 'SELECT * FROM user_quotes WHERE idguild=%s ORDER BY idquote'  # noqa
-    SELECT_QUOTE_USER = 'SELECT * FROM user_quotes WHERE idguild=%s AND username=%s'  # noqa
-    SELECT_QUOTE_ID = 'SELECT * FROM user_quotes WHERE idguild=%s AND idquote=%s'  # noqa
 
-    SELECT_GUILD_TTS = 'SELECT idquote, file_name FROM quotes as q INNER JOIN tts_file_references as t ON q.idquote = t.quote_id WHERE q.idguild = %s'  # noqa
-    SELECT_ID_TTS = 'SELECT * FROM tts_file_references WHERE quote_id=%s'
+class DatabaseManager:
 
-    SELECT_NULL_TTS = 'SELECT * FROM quotes WHERE idquote NOT IN (SELECT quote_id FROM tts_file_references)'  # noqa
-    SELECT_QUOTE_COUNT = 'SELECT COUNT(*) from quotes WHERE idguild=%s'
+    def __init__(self, loop, engine=None, replicas=None):  # noqa
 
+        # Calls may come from any event loop, such as the one owned
+        # by the TTS thread, and run on the loop that made them.
+        self.loop = loop
 
-class DatabaseUpdate:
+        # The database being used, chosen by the environment
+        # unless one is provided.
+        # Read replicas come from the environment along with the
+        # engine, unless either is provided.
+        if engine is None:
+            engine = create_engine()
+            if replicas is None:
+                replicas = create_replicas(engine)
+        self.engine = engine
+        self.replicas = replicas
+
+        # Guild id, or `None` for writes outside a guild, to the
+        # time of its last write.  See `_use_replica()`.  Shared by
+        # every loop using the manager, such as the TTS thread's.
+        self._written = {}
+        self._written_lock = threading.Lock()
+        self.replica_lag = float(os.getenv('DB_REPLICA_LAG', REPLICA_LAG))
+
+        workers = self.engine.pool_size
+        if self.replicas is not None:
+            workers *= 1 + len(self.replicas)
+
+        # Database work runs on its own executor rather than the loop's
+        # default one, which is shared with the youtube lookups.
+        # It is sized to the engine's pool so a worker thread never
+        # waits on the pool for a connection, with room for as many
+        # reads again on each replica.
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='hermes_db')
+
+        # Cache of guild users, invalidated whenever users are written
+        self.users = UserDirectory()
+
+        # Caches of single quote and TTS file lookups, which are
+        # replayed often.  Entries are invalidated by the writes
+        # which change them.
+        cache_size = int(os.getenv('DB_CACHE_SIZE', CACHE_SIZE))
+        cache_ttl = float(os.getenv('DB_CACHE_TTL', CACHE_TTL))
+        self.quote_cache = ResultCache(cache_size, cache_ttl)
+        self.tts_cache = ResultCache(cache_size, cache_ttl)
+
+        # Statement latencies and pool usage
+        self.metrics = DatabaseMetrics(self.engine.pool_size)
+        self.engine.metrics = self.metrics
+
+    def _timed(self, submitted, name, func, *args):
+        """
+        Runs on the database executor.  Records how long the call
+        waited for a thread and how long the statement took.
+        """
+        started = time.perf_counter()
+        self.metrics.record_executor_wait(started - submitted)
 
-    REPLACE_GUILD_SETTINGS_SONG_VOLUME = 'INSERT INTO guild_settings (idguild, volumem, volumeq, playlist) VALUES(%s, %s, 1, "")    ON DUPLICATE KEY UPDATE idguild=%s, volumem=%s'  # noqa
-    REPLACE_GUILD_SETTINGS_QUOTE_VOLUME = 'INSERT INTO guild_settings (idguild, volumem, volumeq, playlist) VALUES(%s, 0.05, %s, "") ON DUPLICATE KEY UPDATE idguild=%s, volumeq=%s'  # noqa
-    REPLACE_GUILD_SETTINGS_PLAYLIST = 'INSERT INTO guild_settings (idguild, volumem, volumeq, playlist) VALUES(%s, 0.05, 1, %s)  ON DUPLICATE KEY UPDATE idguild=%s, playlist=%s'  # noqa
+        try:
+            return func(*args)
+        finally:
+            self.metrics.record_statement(
+                name, time.perf_counter() - started)
 
-    INSERT_GUILD_USER = 'INSERT INTO users (idguild, username) VALUES (%s, %s)'
-    INSERT_GUILD_QUOTE = 'INSERT INTO quotes (idguild, iduser, quote_data, quote_date) VALUES (%s, %s, %s, %s)'  # noqa
-    INSERT_TTS_FILE = 'INSERT INTO tts_file_references (quote_id, file_name) VALUES (%s, %s)'  # noqa
+    async def _run(self, query, func, *args, name=None):
+        """
+        Run a blocking database call on the database executor.
+        """
+        if name is None:
+            name = STATEMENT_NAMES.get(query, 'OTHER')
+
+        to_run = partial(self._timed, time.perf_counter(), name, func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, to_run)
+
+    def _wrote(self, guildid):
+        now = time.monotonic()
+        with self._written_lock:
+            self._written[guildid] = now
+
+            # Forget writes the replicas have caught up with
+            if len(self._written) > 1024:
+                caught_up = [key for key, written in self._written.items()
+                             if now - written >= self.replica_lag]
+                for key in caught_up:
+                    del self._written[key]
+
+    def _use_replica(self, guildid):
+        """
+        Reads go to a replica unless the guild wrote recently, so
+        a guild always reads its own writes.  Reads outside a guild
+        follow writes outside a guild.
+        """
+        if self.replicas is None:
+            return False
 
-    DELETE_GUILD_QUOTE = 'DELETE FROM quotes WHERE idguild=%s AND idquote=%s'  # noqa
+        with self._written_lock:
+            written = self._written.get(guildid)
+        return (written is None
+                or time.monotonic() - written >= self.replica_lag)
 
-    REMOVE_QUOTE_USER = 'UPDATE quotes SET iduser=-1 WHERE idguild=%s AND iduser=%s'  # noqa
-    DELETE_GUILD_USER = 'DELETE FROM users WHERE idguild=%s AND iduser=%s'
+    def _read_replica(self, query, data):
+        """
+        Runs on the database executor.  Reads from a replica,
+        falling back to the primary if none are healthy.
+        """
+        picked = self.replicas.pick()
 
+        if picked is not None:
+            replica, engine = picked
+            try:
+                return engine.execute(query, data)
+            except Exception as e:
+                if self.replicas.check(replica, e):
+                    raise
 
-class DatabaseManager:
+        return self.engine.execute(query, data)
 
-    def __init__(self, loop):  # noqa
+    # Async call to the database
+    async def _execute(self, query, data=None, name=None, guildid=None):
+        """
+        Method called to perform an async fetch of information
+        from the database.  `guildid` is the guild the statement
+        reads or writes, if any.
 
-        # Load environment details
-        load_dotenv()
+        :return: `[(data), (data)]`
+        """
+        translated = self.engine.translate(query)
 
-        # Set connections details
-        self.host = os.getenv('DB_HOST')
-        self.dbName = os.getenv('DB_NAME')
-        self.user = os.getenv('DB_USER')
-        self.passw = os.getenv('DB_PASS')
+        if query.startswith('SELECT'):
+            if self._use_replica(guildid):
+                return await self._run(query, self._read_replica,
+                                       translated, data, name=name)
+            return await self._run(query, self.engine.execute,
+                                   translated, data, name=name)
 
-        self.loop = loop
+        try:
+            return await self._run(query, self.engine.execute,
+                                   translated, data, name=name)
+        finally:
+            self._wrote(guildid)
 
-        # Create the connection pool
-        self._create_pool()
+    async def _execute_many(self, query, rows, guildids=(None,)):
+        """
+        Method called to perform the same update for many rows.
 
-    def _create_pool(self):
+        :return: The number of rows affected
+        """
+        translated = self.engine.translate(query)
+        try:
+            return await self._run(query, self.engine.executemany,
+                                   translated, rows)
+        finally:
+            for guildid in guildids:
+                self._wrote(guildid)
 
-        # Database login details
-        temp = {
-            'host': self.host,
-            'database': self.dbName,
-            'user': self.user,
-            'password': self.passw,
-            'autocommit': True
-        }
+    async def run_batch(self, batch, guildid=None):
+        """
+        Run every statement in a `Batch` on one connection with
+        a single commit.  If any statement fails none are applied.
 
-        # Create the pool
-        self.pool = pooling.MySQLConnectionPool(pool_name='hermers_pool',  # noqa
-                                                                pool_size=5,
-                                                                **temp)
+        :return: A result for each statement, see `Batch`
+        """
+        if len(batch) == 0:
+            return []
 
-    def _get_connection(self):
+        statements = [(self.engine.translate(query), data, many)
+                      for query, data, many in batch.statements]
+        try:
+            return await self._run(None, self.engine.execute_batch,
+                                   statements,
+                                   name=batch.names(STATEMENT_NAMES))
+        finally:
+            self._wrote(guildid)
+
+    def _stream(self, query, data, consume, size):
+        chunks = self.engine.stream(query, data, size)
+        try:
+            for rows in chunks:
+                consume(rows)
+        finally:
+            chunks.close()
+
+    async def stream(self, query, data, consume, size=1000):
         """
-        Returns a connection from the connections
-        pool.
-        :return: `mysql.connection`
+        Feed the rows of a query to `consume()` a chunk at a time,
+        so results of any size are read in constant memory.
+        `consume()` runs on the database executor and may block.
         """
-        return self.pool.get_connection()
+        translated = self.engine.translate(query)
+        return await self._run(query, self._stream,
+                               translated, data, consume, size)
 
-    def _perform_execute(self, cursor, query, data):
+    @staticmethod
+    def _quote_key(quoteid):
         """
-        Performs an execute action on the database.
+        Quote ids arrive as text from some commands.  Cache keys
+        use the integer so writes invalidate the same entry.
         """
-        cursor.execute(query, data)
-
-    async def _insert_quote(self, query, data):
-        # Get a connection from the pool
-        connection = await self.loop.run_in_executor(None, self._get_connection)  # noqa
-        cursor = connection.cursor()
+        try:
+            return int(quoteid)
+        except (TypeError, ValueError):
+            return quoteid
 
-        # Perform the query to the database
-        to_run = partial(self._perform_execute, cursor, query, data)
-        await self.loop.run_in_executor(None, to_run)
+    async def _cached(self, cache, key, query, data, guildid=None):
+        """
+        Fetch a result through one of the result caches.
+        """
+        result = cache.get(key)
+        if result is not MISSING:
+            return result
 
-        rowid = cursor.lastrowid
+        version = cache.version()
+        result = await self._execute(query, data=data, guildid=guildid)
+        cache.put(key, result, version)
+        return result
 
-        # Release the connection back to the pool
-        cursor.close()
-        connection.close()
+    def stats(self):
+        """
+        Returns the database metrics along with the current
+        state of the connection pool.
+        """
+        snapshot = self.metrics.snapshot()
+        snapshot['pool'].update(self.engine.pool_stats())
+        snapshot['cache'] = {
+            'quotes': self.quote_cache.stats(),
+            'tts': self.tts_cache.stats(),
+        }
 
-        return rowid
+        if self.replicas is not None:
+            snapshot['replicas'] = self.replicas.stats()
+        return snapshot
 
-    # Async call to the database
-    async def _execute(self, query, data=None):
+    def close(self):
         """
-        Method called to perform an async fetch of information
-        from the database.
+        Stop the database executor and close the engine.  Queries
+        already submitted are allowed to finish.
+        """
+        self._executor.shutdown(wait=True)
+        self.engine.close()
 
-        :return: `[(data), (data)]`
+        if self.replicas is not None:
+            self.replicas.close()
+
+    async def _get_user_directory(self, guildid):
         """
+        Returns the cached users for a guild, loading them from
+        the database on a miss.
 
-        # Get a connection from the pool
-        connection = await self.loop.run_in_executor(None, self._get_connection)  # noqa
-        cursor = connection.cursor()
+        :return: `GuildUsers()`
+        """
+        users = self.users.get(guildid)
+
+        if users is None:
+            version = self.users.version()
+            rows = await self._execute(
+                DatabaseQuery.SELECT_GUILD_USERS,
+                data=(guildid,),
+                guildid=guildid
+            )
+            users = self.users.load(guildid, rows, version)
+        return users
 
-        # Perform the query to the database
-        to_run = partial(self._perform_execute, cursor, query, data)
-        await self.loop.run_in_executor(None, to_run)
+    async def get_guild_users(self, guildid):
+        users = await self._get_user_directory(guildid)
+        return list(users.rows)
 
-        # Get values
-        try:
-            values = cursor.fetchall()
-        except InterfaceError:
-            values = cursor.lastrowid
+    async def find_guild_user(self, guildid, username):
+        """
+        Case insensitive lookup of a user in a guild.
 
-        # Release the connection back to the pool
-        cursor.close()
-        connection.close()
+        :return: `(data)` or `None`
+        """
+        users = await self._get_user_directory(guildid)
+        return self.users.find(users, username)
 
-        # Return the results
-        return values
+    async def find_guild_users(self, guildid, usernames):
+        """
+        Case insensitive lookup of many users in a guild, with the
+        directory loaded once.
 
-    async def get_guild_users(self, guildid):
-        return await self._execute(
-            DatabaseQuery.SELECT_GUILD_USERS,
-            data=(guildid,)
-        )
+        :return: `{username: (data) or None}`
+        """
+        users = await self._get_user_directory(guildid)
+        return {username: self.users.find(users, username)
+                for username in usernames}
 
     async def add_guild_user(self, guildid, username):
-        await self._execute(
-            DatabaseUpdate.INSERT_GUILD_USER,
-            data=(guildid, username,)
-        )
+        try:
+            await self._execute(
+                DatabaseUpdate.INSERT_GUILD_USER,
+                data=(guildid, username,),
+                guildid=guildid
+            )
+        finally:
+            self.users.invalidate(guildid)
+
+    async def add_guild_users(self, guildid, usernames):
+        """
+        Add many users to a guild in one batch.
+        """
+        try:
+            await self._execute_many(
+                DatabaseUpdate.INSERT_GUILD_USER,
+                [(guildid, username,) for username in usernames],
+                guildids=(guildid,)
+            )
+        finally:
+            self.users.invalidate(guildid)
 
     async def remove_guild_user(self, guildid, username):
-        await self._execute(
-            DatabaseUpdate.DELETE_GUILD_USER,
-            data=(guildid, username,)
-        )
+        try:
+            await self._execute(
+                DatabaseUpdate.DELETE_GUILD_USER,
+                data=(guildid, username,),
+                guildid=guildid
+            )
+        finally:
+            self.users.invalidate(guildid)
+
+            # Cached quotes carry the user's name
+            self.quote_cache.clear()
 
     async def add_user_quote(self, guildid, userid, quote):
         """idguild, iduser, quote_data, quote_date"""
@@ -158,81 +360,445 @@ class DatabaseManager:
         now = datetime.datetime.utcnow()
         formated = now.strftime('%Y-%m-%d %H:%M:%S')
 
-        return await self._insert_quote(
-            DatabaseUpdate.INSERT_GUILD_QUOTE,
-            data=(guildid, userid, quote, formated,)
-        )
+        batch = Batch()
+        quoteid = batch.add(DatabaseUpdate.INSERT_GUILD_QUOTE,
+                            (guildid, userid, quote, formated,))
+
+        # Its TTS job, as one someone is waiting on
+        batch.add(DatabaseUpdate.INSERT_TTS_JOB,
+                  (quoteid, 0, formated,))
+        batch.add(DatabaseUpdate.UPSERT_QUOTE_USER_STATS,
+                  (guildid, userid, 1,))
+        batch.add(DatabaseUpdate.UPSERT_QUOTE_MONTH_STATS,
+                  (guildid, formated[:7], userid, 1,))
+
+        results = await self.run_batch(batch, guildid)
+
+        # Drop any cached lookup made before the quote existed
+        self.quote_cache.invalidate((guildid, results[0]))
+        self.tts_cache.invalidate(results[0])
+        return results[0]
+
+    async def add_user_quotes(self, rows, ids=False):
+        """
+        Add many quotes in one batch.
+
+        :param rows: `[(idguild, iduser, quote_data, quote_date)]`
+        :param ids: Insert the quotes one at a time, within the
+                    batch, to learn their ids
+        :return: The number of quotes added, or their ids in order
+        """
+        if len(rows) == 0:
+            return [] if ids else 0
+
+        users = collections.Counter()
+        months = collections.Counter()
+        for guildid, userid, _, date in rows:
+            users[(guildid, userid)] += 1
+            months[(guildid, str(date)[:7], userid)] += 1
+
+        batch = Batch()
+        if ids:
+            for row in rows:
+                batch.add(DatabaseUpdate.INSERT_GUILD_QUOTE, row)
+        else:
+            batch.add_many(DatabaseUpdate.INSERT_GUILD_QUOTE, rows)
+        batch.add_many(DatabaseUpdate.UPSERT_QUOTE_USER_STATS,
+                       [key + (count,) for key, count in users.items()])
+        batch.add_many(DatabaseUpdate.UPSERT_QUOTE_MONTH_STATS,
+                       [key + (count,) for key, count in months.items()])
+
+        try:
+            results = await self.run_batch(batch)
+            return results[:len(rows)] if ids else results[0]
+        finally:
+            for guildid, _ in users:
+                self._wrote(guildid)
+
+            self.quote_cache.clear()
+            self.tts_cache.clear()
 
     async def remove_user_quote(self, guildid, quoteid):
+        batch = Batch()
+        batch.add(DatabaseUpdate.DECREMENT_QUOTE_USER_STATS,
+                  (guildid, guildid, quoteid,))
+        batch.add(DatabaseUpdate.DECREMENT_QUOTE_MONTH_STATS,
+                  (guildid, guildid, quoteid, guildid, quoteid,))
+        batch.add(DatabaseUpdate.DELETE_GUILD_QUOTE,
+                  (guildid, quoteid,))
+
+        try:
+            await self.run_batch(batch, guildid)
+        finally:
+            self.quote_cache.invalidate((guildid, self._quote_key(quoteid)))
+            self.tts_cache.invalidate(self._quote_key(quoteid))
+
+    async def add_tts_files(self, rows):
+        """
+        Store the references of many finished TTS files with one
+        commit.  References to quotes which have been removed, or
+        which already have a file, are skipped.
+
+        :param rows: `[(quote_id, file_name)]`
+        """
+        batch = Batch()
+        batch.add_many(DatabaseUpdate.INSERT_TTS_FILE_MISSING,
+                       [(filename, quoteid,) for quoteid, filename in rows])
+
+        try:
+            results = await self.run_batch(batch)
+        finally:
+            for quoteid, _ in rows:
+                self.tts_cache.invalidate(quoteid)
+        return results[0] if len(results) > 0 else 0
+
+    async def complete_tts_jobs(self, rows):
+        """
+        Store the references of finished TTS files and delete their
+        jobs with one commit.
+
+        :param rows: `[(quote_id, file_name)]`
+        """
+        batch = Batch()
+        batch.add_many(DatabaseUpdate.INSERT_TTS_FILE_MISSING,
+                       [(filename, quoteid,) for quoteid, filename in rows])
+        batch.add_many(DatabaseUpdate.DELETE_TTS_JOB,
+                       [(quoteid,) for quoteid, _ in rows])
+
+        try:
+            await self.run_batch(batch)
+        finally:
+            for quoteid, _ in rows:
+                self.tts_cache.invalidate(quoteid)
+
+    async def add_tts_jobs(self, quoteids, priority=1):
+        """
+        Queue TTS jobs for quotes which do not have one.  Jobs which
+        exist are raised to `priority` if it is more urgent.
+        """
+        now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+        batch = Batch()
+        batch.add_many(DatabaseUpdate.INSERT_TTS_JOB_MISSING,
+                       [(priority, now, quoteid,) for quoteid in quoteids])
+        batch.add_many(DatabaseUpdate.PRIORITIZE_TTS_JOB,
+                       [(priority, quoteid, priority,)
+                        for quoteid in quoteids])
+        await self.run_batch(batch)
+
+    async def get_tts_backfill(self):
+        """
+        :return: `(last_quote, running)` of the TTS backfill
+        """
+        rows = await self._execute(DatabaseQuery.SELECT_TTS_BACKFILL)
+        return rows[0] if len(rows) > 0 else (0, 0)
+
+    async def start_tts_backfill(self):
+        """
+        Start a pass over the quotes, or resume the one which was
+        running.
+
+        :return: The id the pass continues after
+        """
+        last_quote, running = await self.get_tts_backfill()
+        if running:
+            return last_quote
+
+        await self._execute(DatabaseUpdate.UPDATE_TTS_BACKFILL,
+                            data=(0, 1,))
+        return 0
+
+    async def queue_missing_tts_jobs(self, after, size=1000):
+        """
+        Queue a TTS job for each quote without a file or a job in the
+        next `size` quotes after `after`, such as quotes added by an
+        import.  The jobs and the new checkpoint are committed
+        together, so a pass can stop at any point and resume.
+
+        :return: `(jobs queued, id to continue after)`, the id being
+                 `None` once every quote has been seen
+        """
+        now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+        rows = await self._execute(DatabaseQuery.SELECT_QUOTE_ID_AFTER,
+                                   data=(after, size - 1,))
+        if len(rows) > 0:
+            last = rows[0][0]
+        else:
+            # Fewer than `size` quotes are left
+            last = (await self._execute(
+                DatabaseQuery.SELECT_LAST_QUOTE_ID))[0][0]
+
+        if last is None or last <= after:
+            await self._execute(DatabaseUpdate.UPDATE_TTS_BACKFILL,
+                                data=(after, 0,))
+            return 0, None
+
+        batch = Batch()
+        batch.add_many(DatabaseUpdate.INSERT_TTS_JOBS_MISSING,
+                       [(now, after, last,)])
+        batch.add(DatabaseUpdate.UPDATE_TTS_BACKFILL, (last, 1,))
+        results = await self.run_batch(batch)
+        return results[0], last
+
+    async def get_due_tts_jobs(self, limit):
+        """
+        :return: `[(quote_id, idguild, quote_data, priority, attempts)]`
+                 of jobs due to run, most urgent first
+        """
+        now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        return await self._execute(
+            DatabaseQuery.SELECT_DUE_TTS_JOBS,
+            data=(now, limit,)
+        )
+
+    async def retry_tts_job(self, quoteid, attempts, retry_at, error,
+                            dead=False):
+        """
+        Record a failed TTS job.  It runs again at `retry_at`, or not
+        at all if it is `dead`.
+        """
         await self._execute(
-            DatabaseUpdate.DELETE_GUILD_QUOTE,
-            data=(guildid, quoteid,)
+            DatabaseUpdate.RETRY_TTS_JOB,
+            data=(attempts, retry_at.strftime('%Y-%m-%d %H:%M:%S'),
+                  str(error)[:1000], 1 if dead else 0, quoteid,)
         )
 
-    async def add_tts_file(self, quoteid, filename):
+    async def get_dead_tts_jobs(self, limit=25):
+        """
+        :return: `[(quote_id, idguild, attempts, last_error)]`
+        """
         return await self._execute(
-            DatabaseUpdate.INSERT_TTS_FILE,
-            data=(quoteid, filename,)
+            DatabaseQuery.SELECT_DEAD_TTS_JOBS,
+            data=(limit,)
         )
 
+    async def get_tts_job_counts(self):
+        """
+        :return: `(waiting, dead)` job counts
+        """
+        counts = dict(await self._execute(
+            DatabaseQuery.SELECT_TTS_JOB_COUNTS))
+        return counts.get(0, 0), counts.get(1, 0)
+
+    async def revive_tts_jobs(self, quoteid=None):
+        """
+        Give dead TTS jobs, or the dead job of one quote, a fresh
+        set of attempts.
+        """
+        now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+        batch = Batch()
+        if quoteid is None:
+            batch.add_many(DatabaseUpdate.REVIVE_ALL_TTS_JOBS, [(now,)])
+        else:
+            batch.add_many(DatabaseUpdate.REVIVE_TTS_JOB, [(now, quoteid,)])
+        results = await self.run_batch(batch)
+        return results[0]
+
+    async def delete_dead_tts_jobs(self):
+        batch = Batch()
+        batch.add_many(DatabaseUpdate.DELETE_DEAD_TTS_JOBS, [()])
+        results = await self.run_batch(batch)
+        return results[0]
+
     async def get_user_quotes(self, guildid, username):
         return await self._execute(
             DatabaseQuery.SELECT_QUOTE_USER,
-            data=(guildid, username,)
+            data=(guildid, username,),
+            guildid=guildid
         )
 
     async def get_quote_from_id(self, guildid, quoteid):
-        return await self._execute(
+        return await self._cached(
+            self.quote_cache, (guildid, self._quote_key(quoteid)),
             DatabaseQuery.SELECT_QUOTE_ID,
-            data=(guildid, quoteid,)
+            data=(guildid, quoteid,),
+            guildid=guildid
         )
 
     async def get_guild_quotes(self, guildid):
         return await self._execute(
             DatabaseQuery.SELECT_QUOTES_GUILD,
-            data=(guildid,)
+            data=(guildid,),
+            guildid=guildid
+        )
+
+    async def get_guild_quote_count(self, guildid):
+        result = await self._execute(
+            DatabaseQuery.SELECT_QUOTES_GUILD_COUNT,
+            data=(guildid,),
+            guildid=guildid
+        )
+        return result[0][0]
+
+    async def get_guild_quotes_after(self, guildid, quoteid, limit):
+        """
+        Returns up to `limit` quotes with an id greater than `quoteid`
+        in ascending order.  With no `quoteid` the first quotes in
+        the guild are returned.
+        """
+        if quoteid is None:
+            quoteid = 0
+
+        return await self._execute(
+            DatabaseQuery.SELECT_QUOTES_GUILD_AFTER,
+            data=(guildid, quoteid, limit,),
+            guildid=guildid
+        )
+
+    async def get_guild_quotes_before(self, guildid, quoteid, limit):
+        """
+        Returns up to `limit` quotes with an id less than `quoteid`
+        in descending order.  With no `quoteid` the last quotes in
+        the guild are returned.
+        """
+        if quoteid is None:
+            return await self._execute(
+                DatabaseQuery.SELECT_QUOTES_GUILD_LAST,
+                data=(guildid, limit,),
+                guildid=guildid
+            )
+
+        return await self._execute(
+            DatabaseQuery.SELECT_QUOTES_GUILD_BEFORE,
+            data=(guildid, quoteid, limit,),
+            guildid=guildid
         )
 
     async def get_guild_tts(self, guildid):
         return await self._execute(
             DatabaseQuery.SELECT_GUILD_TTS,
-            data=(guildid,)
+            data=(guildid,),
+            guildid=guildid
+        )
+
+    async def get_random_guild_tts(self, guildid):
+        """
+        Pick a random quote with a TTS file without fetching
+        every file in the guild.
+
+        :return: `(idquote, file_name)` or `None`
+        """
+        count = await self._execute(
+            DatabaseQuery.SELECT_GUILD_TTS_COUNT,
+            data=(guildid,),
+            guildid=guildid
         )
+        count = count[0][0]
+
+        if count == 0:
+            return None
+
+        quote = await self._execute(
+            DatabaseQuery.SELECT_GUILD_TTS_OFFSET,
+            data=(guildid, random.randrange(0, count),),
+            guildid=guildid
+        )
+
+        # A quote may have been removed between the two queries
+        return quote[0] if len(quote) > 0 else None
 
     async def get_id_tts(self, quoteid):
-        return await self._execute(
+        return await self._cached(
+            self.tts_cache, self._quote_key(quoteid),
             DatabaseQuery.SELECT_ID_TTS,
             data=(quoteid,)
         )
 
-    async def get_guild_settings(self, guilid):
+    async def get_quote_stats(self, guildid):
+        """
+        Quote counts of every user in a guild, read from the
+        statistics tables rather than counted.
+
+        :return: `[(username, quote_count)]`, highest count first
+        """
         return await self._execute(
-            DatabaseQuery.SELECT_GUILD_SETTINGS,
-            data=(guilid,)
+            DatabaseQuery.SELECT_QUOTE_STATS_USERS,
+            data=(guildid,),
+            guildid=guildid
         )
 
-    async def get_missing_tts(self):
+    async def get_month_quote_stats(self, guildid, month):
+        """
+        :param month: `YYYY-MM`
+        :return: `[(username, quote_count)]`, highest count first
+        """
         return await self._execute(
-            DatabaseQuery.SELECT_NULL_TTS
+            DatabaseQuery.SELECT_QUOTE_STATS_MONTH,
+            data=(guildid, month,),
+            guildid=guildid
         )
 
-    async def save_song_volume(self, guildid, svol):
-        """idguild, volumem, volumeq, playlist"""
-        await self._execute(
-            DatabaseUpdate.REPLACE_GUILD_SETTINGS_SONG_VOLUME,
-            data=(guildid, svol, guildid, svol,)
+    async def rebuild_quote_stats(self, guildid=None):
+        """
+        Recount the quote statistics of a guild, or of every guild,
+        from the quotes themselves in one transaction.
+        """
+        batch = Batch()
+
+        if guildid is None:
+            batch.add(DatabaseUpdate.DELETE_ALL_QUOTE_USER_STATS)
+            batch.add(DatabaseUpdate.DELETE_ALL_QUOTE_MONTH_STATS)
+            batch.add(DatabaseUpdate.COUNT_ALL_QUOTE_USER_STATS)
+            batch.add(DatabaseUpdate.COUNT_ALL_QUOTE_MONTH_STATS)
+        else:
+            batch.add(DatabaseUpdate.DELETE_QUOTE_USER_STATS, (guildid,))
+            batch.add(DatabaseUpdate.DELETE_QUOTE_MONTH_STATS, (guildid,))
+            batch.add(DatabaseUpdate.COUNT_QUOTE_USER_STATS, (guildid,))
+            batch.add(DatabaseUpdate.COUNT_QUOTE_MONTH_STATS, (guildid,))
+
+        await self.run_batch(batch, guildid)
+
+    async def get_referenced_tts_files(self, names):
+        """
+        Which of the given TTS file names are referenced by a quote.
+
+        :return: `{file_name}`
+        """
+        if len(names) == 0:
+            return set()
+
+        # Translated before formatting, like `save_guild_settings()`
+        query = self.engine.translate(
+            DatabaseQuery.SELECT_TTS_FILES_REFERENCED)
+
+        rows = await self._execute(
+            query.format(', '.join('%s' for _ in names)),
+            data=tuple(names),
+            name='SELECT_TTS_FILES_REFERENCED'
         )
+        return {row[0] for row in rows}
 
-    async def save_quote_volume(self, guildid, qvol):
-        """idguild, volumem, volumeq, playlist"""
-        await self._execute(
-            DatabaseUpdate.REPLACE_GUILD_SETTINGS_QUOTE_VOLUME,
-            data=(guildid, qvol, guildid, qvol,)
+    async def get_guild_settings(self, guilid):
+        return await self._execute(
+            DatabaseQuery.SELECT_GUILD_SETTINGS,
+            data=(guilid,),
+            guildid=guilid
         )
 
-    async def save_playlist(self, guildid, playlist):
-        """idguild, volumem, volumeq, playlist"""
+    async def save_guild_settings(self, rows):
+        """
+        Save the settings of many guilds with a single upsert.
+
+        :param rows: `[(idguild, volumem, volumeq, playlist, tts_engine)]`
+        """
+        if len(rows) == 0:
+            return
+
+        values = ', '.join(
+            DatabaseUpdate.REPLACE_GUILD_SETTINGS_ROW for _ in rows)
+        data = tuple(value for row in rows for value in row)
+
+        # Translated before formatting since the formatted
+        # statement is no longer part of the catalogue.
+        query = self.engine.translate(DatabaseUpdate.REPLACE_GUILD_SETTINGS)
+
         await self._execute(
-            DatabaseUpdate.REPLACE_GUILD_SETTINGS_PLAYLIST,
-            data=(guildid, playlist, guildid, playlist,)
+            query.format(values),
+            data=data,
+            name='REPLACE_GUILD_SETTINGS'
         )
+
+        for row in rows:
+            self._wrote(row[0])
@@ -0,0 +1,66 @@
+from .queries import DatabaseQuery
+
+
+class PlanCheck:
+    """
+    The query plan a catalogue query is expected to have.
+
+    No table may be read in full unless it is listed in
+    `full_scans`, and the tables in `covering` must be read from
+    an index alone, without touching the table rows.
+    """
+
+    def __init__(self, name, data, full_scans=(), covering=()):
+        self.name = name
+        self.query = getattr(DatabaseQuery, name)
+        self.data = data
+        self.full_scans = set(full_scans)
+        self.covering = set(covering)
+
+    def problems(self, steps):
+        """
+        :param steps: `[PlanStep()]` from `StorageEngine.explain()`
+        :return: A description of every way the plan falls short
+        """
+        problems = []
+
+        for step in steps:
+            if step.full_scan and step.table not in self.full_scans:
+                problems.append(f'full scan of {step.table}')
+
+            if step.table in self.covering and not step.covering:
+                problems.append(f'{step.table} is not read from an index alone')  # noqa
+        return problems
+
+
+# `j`, `q`, `t` and `u` are the aliases used by the queries and the
+# user_quotes view.
+PLAN_CHECKS = [
+    PlanCheck('SELECT_GUILD_USERS', (1,), covering=['users']),
+    PlanCheck('SELECT_QUOTE_USER', (1, 'user_1')),
+    PlanCheck('SELECT_QUOTE_ID', (1, 1)),
+    PlanCheck('SELECT_QUOTES_GUILD_AFTER', (1, 0, 10)),
+    PlanCheck('SELECT_QUOTES_GUILD_COUNT', (1,), covering=['q']),
+    PlanCheck('SELECT_GUILD_TTS', (1,), covering=['q', 't']),
+    PlanCheck('SELECT_GUILD_TTS_COUNT', (1,), covering=['q', 't']),
+    PlanCheck('SELECT_ID_TTS', (1,)),
+    PlanCheck('SELECT_EXPORT_QUOTES', (1,)),
+    PlanCheck('SELECT_QUOTE_STATS_USERS', (1,)),
+    PlanCheck('SELECT_QUOTE_STATS_MONTH', (1, '2021-01')),
+    PlanCheck('SELECT_DUE_TTS_JOBS', ('2021-01-01 00:00:00', 200)),
+    PlanCheck('SELECT_QUOTE_ID_AFTER', (0, 999), covering=['quotes']),
+]
+
+
+def check_plans(engine, checks=PLAN_CHECKS):
+    """
+    Explain every checked query.  This blocks.
+
+    :return: `[(PlanCheck(), [PlanStep()], [problem])]`
+    """
+    results = []
+
+    for check in checks:
+        steps = engine.explain(engine.translate(check.query), check.data)
+        results.append((check, steps, check.problems(steps)))
+    return results
@@ -0,0 +1,124 @@
+import bisect
+import math
+import threading
+
+# Bucket upper bounds in seconds.  Each bucket is 25% wider than the
+# last, covering 10us to about 100s, so a percentile is never more
+# than 25% above the true value.
+BUCKETS = tuple(1e-5 * 1.25 ** i for i in range(73))
+
+
+class LatencyHistogram:
+    """
+    Fixed bucket histogram of durations in seconds.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """
+        :return: The upper bound of the bucket holding the percentile
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = math.ceil(percent / 100 * self.count)
+        seen = 0
+
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+
+        if index == len(BUCKETS):
+            return self.max
+        return min(BUCKETS[index], self.max)
+
+    def summary(self):
+        """
+        :return: `{count, mean, p50, p95, p99, max}` in milliseconds
+        """
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'mean': mean * 1000,
+            'p50': self.percentile(50) * 1000,
+            'p95': self.percentile(95) * 1000,
+            'p99': self.percentile(99) * 1000,
+            'max': self.max * 1000,
+        }
+
+
+class DatabaseMetrics:
+    """
+    Timings for the database layer.
+
+    Records the latency of every statement by its catalogue name,
+    how long work waits for an executor thread, how long a thread
+    waits to check a connection out of the pool and how many
+    connections are in use.  Safe to use from any thread.
+    """
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+
+        self.statements = {}
+        self.executor_wait = LatencyHistogram()
+        self.pool_wait = LatencyHistogram()
+        self.in_use = 0
+        self.peak_in_use = 0
+
+        self._lock = threading.Lock()
+
+    def record_statement(self, name, seconds):
+        with self._lock:
+            try:
+                histogram = self.statements[name]
+            except KeyError:
+                histogram = self.statements[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def record_executor_wait(self, seconds):
+        with self._lock:
+            self.executor_wait.record(seconds)
+
+    def checked_out(self, seconds):
+        """Called once a connection has been taken from the pool."""
+        with self._lock:
+            self.pool_wait.record(seconds)
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def checked_in(self):
+        """Called when a connection is returned to the pool."""
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self):
+        """
+        :return: A dictionary of every metric, safe to dump as json
+        """
+        with self._lock:
+            return {
+                'statements': {
+                    name: histogram.summary()
+                    for name, histogram in sorted(self.statements.items())
+                },
+                'executor_wait': self.executor_wait.summary(),
+                'pool': {
+                    'max_size': self.pool_size,
+                    'in_use': self.in_use,
+                    'peak_in_use': self.peak_in_use,
+                    'wait': self.pool_wait.summary(),
+                },
+            }
@@ -0,0 +1,41 @@
+-- Base schema.  Every statement is safe to run against a database
+-- which was created before migrations existed.
+
+CREATE TABLE IF NOT EXISTS guild_settings (
+    idguild BIGINT UNSIGNED NOT NULL,
+    volumem FLOAT NOT NULL DEFAULT 0.05,
+    volumeq FLOAT NOT NULL DEFAULT 1,
+    playlist TEXT NOT NULL,
+    PRIMARY KEY (idguild)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS users (
+    iduser INT NOT NULL AUTO_INCREMENT,
+    idguild BIGINT UNSIGNED NOT NULL,
+    username VARCHAR(100) NOT NULL,
+    PRIMARY KEY (iduser)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS quotes (
+    idquote INT NOT NULL AUTO_INCREMENT,
+    iduser INT NOT NULL,
+    idguild BIGINT UNSIGNED NOT NULL,
+    quote_data TEXT NOT NULL,
+    quote_date DATETIME NOT NULL,
+    PRIMARY KEY (idquote)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS tts_file_references (
+    quote_id INT NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    PRIMARY KEY (quote_id),
+    FOREIGN KEY (quote_id) REFERENCES quotes (idquote) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Callers read the view's columns by position, so an existing view
+-- is left as it is rather than redefined.  MySQL has no CREATE VIEW
+-- IF NOT EXISTS, so information_schema is checked as in 0002.
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.views WHERE table_schema = DATABASE() AND table_name = 'user_quotes') = 0, 'CREATE VIEW user_quotes AS SELECT q.idquote, q.idguild, u.username, q.iduser, q.quote_data, q.quote_date FROM quotes AS q INNER JOIN users AS u ON u.idguild = q.idguild AND u.iduser = q.iduser', 'DO 0');
+PREPARE create_view FROM @ddl;
+EXECUTE create_view;
+DEALLOCATE PREPARE create_view;
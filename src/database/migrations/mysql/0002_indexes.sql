@@ -0,0 +1,32 @@
+-- Composite indexes for the access paths in DatabaseQuery.
+--
+-- MySQL has no CREATE INDEX IF NOT EXISTS, so each index is only
+-- created when information_schema does not list it already, such as
+-- after a run which stopped part way or one made by hand.
+
+-- SELECT_GUILD_USERS and the username half of SELECT_QUOTE_USER.
+-- Covers every column of users since InnoDB appends the primary key.
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = 'users' AND index_name = 'users_guild_name') = 0, 'CREATE INDEX users_guild_name ON users (idguild, username)', 'DO 0');
+PREPARE create_index FROM @ddl;
+EXECUTE create_index;
+DEALLOCATE PREPARE create_index;
+
+-- The quote half of SELECT_QUOTE_USER.
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = 'quotes' AND index_name = 'quotes_guild_user') = 0, 'CREATE INDEX quotes_guild_user ON quotes (idguild, iduser)', 'DO 0');
+PREPARE create_index FROM @ddl;
+EXECUTE create_index;
+DEALLOCATE PREPARE create_index;
+
+-- Keyset pages, counts and SELECT_GUILD_TTS.
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = 'quotes' AND index_name = 'quotes_guild_quote') = 0, 'CREATE INDEX quotes_guild_quote ON quotes (idguild, idquote)', 'DO 0');
+PREPARE create_index FROM @ddl;
+EXECUTE create_index;
+DEALLOCATE PREPARE create_index;
+
+-- Joins from quotes to their TTS file, without touching the row on
+-- databases created before migrations, where quote_id may not be
+-- the primary key.
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = 'tts_file_references' AND index_name = 'tts_quote_file') = 0, 'CREATE INDEX tts_quote_file ON tts_file_references (quote_id, file_name)', 'DO 0');
+PREPARE create_index FROM @ddl;
+EXECUTE create_index;
+DEALLOCATE PREPARE create_index;
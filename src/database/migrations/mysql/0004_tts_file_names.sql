@@ -0,0 +1,7 @@
+-- TTS files are shared by every quote with the same text, so files
+-- are looked up by name to count their references.  Guarded as in
+-- 0002.
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = 'tts_file_references' AND index_name = 'tts_file_name') = 0, 'CREATE INDEX tts_file_name ON tts_file_references (file_name)', 'DO 0');
+PREPARE create_index FROM @ddl;
+EXECUTE create_index;
+DEALLOCATE PREPARE create_index;
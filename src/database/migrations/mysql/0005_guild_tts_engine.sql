@@ -0,0 +1,7 @@
+-- The TTS engine a guild's quotes are spoken with.  NULL uses the
+-- deployment's engine.  Only added when information_schema does not
+-- list the column already, as in 0002.
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = 'guild_settings' AND column_name = 'tts_engine') = 0, 'ALTER TABLE guild_settings ADD COLUMN tts_engine VARCHAR(32) NULL DEFAULT NULL', 'DO 0');
+PREPARE add_column FROM @ddl;
+EXECUTE add_column;
+DEALLOCATE PREPARE add_column;
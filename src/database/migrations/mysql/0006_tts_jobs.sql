@@ -0,0 +1,22 @@
+-- TTS jobs which have not finished, so work survives a restart and
+-- failed jobs are retried with a backoff.  Priority 0 is a quote
+-- someone is waiting on, 1 is background work.  Jobs which failed
+-- too often are kept as dead letters until an admin retries them.
+
+CREATE TABLE IF NOT EXISTS tts_jobs (
+    quote_id INT NOT NULL,
+    priority TINYINT NOT NULL DEFAULT 1,
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt DATETIME NOT NULL,
+    last_error TEXT NULL,
+    dead TINYINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (quote_id),
+    INDEX tts_jobs_due (dead, priority, next_attempt),
+    FOREIGN KEY (quote_id) REFERENCES quotes (idquote) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Queue the quotes which do not have a TTS file yet
+INSERT INTO tts_jobs (quote_id, priority, next_attempt)
+    SELECT q.idquote, 1, UTC_TIMESTAMP() FROM quotes AS q
+    LEFT JOIN tts_file_references AS t ON t.quote_id = q.idquote
+    WHERE t.quote_id IS NULL;
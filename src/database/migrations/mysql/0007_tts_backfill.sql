@@ -0,0 +1,12 @@
+-- Checkpoint of the pass which queues TTS jobs for quotes without
+-- audio.  Quotes are queued in id order, so a pass stopped part way
+-- resumes after `last_quote`.
+
+CREATE TABLE IF NOT EXISTS tts_backfill (
+    id TINYINT NOT NULL,
+    last_quote INT NOT NULL DEFAULT 0,
+    running TINYINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT IGNORE INTO tts_backfill (id, last_quote, running) VALUES (1, 0, 0);
@@ -0,0 +1,35 @@
+-- Base schema.
+
+CREATE TABLE IF NOT EXISTS guild_settings (
+    idguild INTEGER PRIMARY KEY,
+    volumem REAL NOT NULL DEFAULT 0.05,
+    volumeq REAL NOT NULL DEFAULT 1,
+    playlist TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    iduser INTEGER PRIMARY KEY AUTOINCREMENT,
+    idguild INTEGER NOT NULL,
+    username TEXT NOT NULL COLLATE NOCASE
+);
+
+CREATE TABLE IF NOT EXISTS quotes (
+    idquote INTEGER PRIMARY KEY AUTOINCREMENT,
+    iduser INTEGER NOT NULL,
+    idguild INTEGER NOT NULL,
+    quote_data TEXT NOT NULL,
+    quote_date TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tts_file_references (
+    quote_id INTEGER PRIMARY KEY
+        REFERENCES quotes (idquote) ON DELETE CASCADE,
+    file_name TEXT NOT NULL
+);
+
+CREATE VIEW IF NOT EXISTS user_quotes AS
+    SELECT q.idquote, q.idguild, u.username, q.iduser,
+           q.quote_data, q.quote_date
+    FROM quotes AS q
+    INNER JOIN users AS u
+        ON u.idguild = q.idguild AND u.iduser = q.iduser;
@@ -0,0 +1,12 @@
+-- Composite indexes for the access paths in DatabaseQuery.  TTS files
+-- need none since quote_id is the rowid of tts_file_references.
+
+-- SELECT_GUILD_USERS and the username half of SELECT_QUOTE_USER.
+CREATE INDEX IF NOT EXISTS users_guild_name ON users (idguild, username);
+
+-- The quote half of SELECT_QUOTE_USER.
+CREATE INDEX IF NOT EXISTS quotes_guild_user ON quotes (idguild, iduser);
+
+-- Keyset pages, counts and SELECT_GUILD_TTS.
+CREATE INDEX IF NOT EXISTS quotes_guild_quote ON quotes (idguild, idquote);
+
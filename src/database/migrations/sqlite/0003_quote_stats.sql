@@ -0,0 +1,27 @@
+-- Quote counts per user, and per user in each month, kept up to
+-- date as quotes are added and removed so stats never count quotes.
+-- A month is the first seven characters of quote_date, `YYYY-MM`.
+
+CREATE TABLE IF NOT EXISTS quote_user_stats (
+    idguild INTEGER NOT NULL,
+    iduser INTEGER NOT NULL,
+    quote_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (idguild, iduser)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS quote_month_stats (
+    idguild INTEGER NOT NULL,
+    quote_month TEXT NOT NULL,
+    iduser INTEGER NOT NULL,
+    quote_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (idguild, quote_month, iduser)
+) WITHOUT ROWID;
+
+-- Count the quotes which already exist
+INSERT INTO quote_user_stats (idguild, iduser, quote_count)
+    SELECT idguild, iduser, COUNT(*) FROM quotes
+    GROUP BY idguild, iduser;
+
+INSERT INTO quote_month_stats (idguild, quote_month, iduser, quote_count)
+    SELECT idguild, SUBSTR(quote_date, 1, 7), iduser, COUNT(*) FROM quotes
+    GROUP BY idguild, SUBSTR(quote_date, 1, 7), iduser;
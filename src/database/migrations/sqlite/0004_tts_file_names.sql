@@ -0,0 +1,3 @@
+-- TTS files are shared by every quote with the same text, so files
+-- are looked up by name to count their references.
+CREATE INDEX IF NOT EXISTS tts_file_name ON tts_file_references (file_name);
@@ -0,0 +1,3 @@
+-- The TTS engine a guild's quotes are spoken with.  NULL uses the
+-- deployment's engine.
+ALTER TABLE guild_settings ADD COLUMN tts_engine TEXT DEFAULT NULL;
@@ -0,0 +1,23 @@
+-- TTS jobs which have not finished, so work survives a restart and
+-- failed jobs are retried with a backoff.  Priority 0 is a quote
+-- someone is waiting on, 1 is background work.  Jobs which failed
+-- too often are kept as dead letters until an admin retries them.
+
+CREATE TABLE IF NOT EXISTS tts_jobs (
+    quote_id INTEGER PRIMARY KEY
+        REFERENCES quotes (idquote) ON DELETE CASCADE,
+    priority INTEGER NOT NULL DEFAULT 1,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt TEXT NOT NULL,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS tts_jobs_due
+    ON tts_jobs (dead, priority, next_attempt);
+
+-- Queue the quotes which do not have a TTS file yet
+INSERT INTO tts_jobs (quote_id, priority, next_attempt)
+    SELECT q.idquote, 1, DATETIME('now') FROM quotes AS q
+    LEFT JOIN tts_file_references AS t ON t.quote_id = q.idquote
+    WHERE t.quote_id IS NULL;
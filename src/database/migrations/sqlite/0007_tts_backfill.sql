@@ -0,0 +1,12 @@
+-- Checkpoint of the pass which queues TTS jobs for quotes without
+-- audio.  Quotes are queued in id order, so a pass stopped part way
+-- resumes after `last_quote`.
+
+CREATE TABLE IF NOT EXISTS tts_backfill (
+    id INTEGER PRIMARY KEY,
+    last_quote INTEGER NOT NULL DEFAULT 0,
+    running INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO tts_backfill (id, last_quote, running)
+    VALUES (1, 0, 0);
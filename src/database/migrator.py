@@ -0,0 +1,97 @@
+import datetime
+import os
+import re
+
+MIGRATIONS_PATH = os.path.join(os.path.dirname(__file__), 'migrations')
+
+# Files are named `0001_description.sql`
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+CREATE_VERSION_TABLE = 'CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL, applied_at VARCHAR(32) NOT NULL)'  # noqa
+SELECT_VERSIONS = 'SELECT version FROM schema_version'
+INSERT_VERSION = 'INSERT INTO schema_version (version, name, applied_at) VALUES (%s, %s, %s)'  # noqa
+
+
+class Migration:
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def __str__(self):
+        return f'{self.version:04d}_{self.name}'
+
+    def statements(self):
+        """
+        Split the file into statements.  Statements end with a `;`
+        at the end of a line and `--` comment lines are ignored.
+        """
+        with open(self.path, encoding='utf-8') as file:
+            lines = [line for line in file
+                     if not line.lstrip().startswith('--')]
+
+        statements = re.split(r';\s*$', ''.join(lines), flags=re.MULTILINE)
+        return [s.strip() for s in statements if s.strip()]
+
+
+class Migrator:
+    """
+    Brings a database schema up to date.
+
+    Migrations are the numbered sql files in `migrations/<engine>`.
+    The versions which have been applied are recorded in the
+    `schema_version` table and each migration runs exactly once,
+    in order.
+    """
+
+    def __init__(self, engine, path=MIGRATIONS_PATH):
+        self.engine = engine
+        self.path = os.path.join(path, engine.name)
+
+    def migrations(self):
+        """
+        :return: Every migration for the engine, oldest first
+        """
+        migrations = []
+
+        for filename in os.listdir(self.path):
+            match = MIGRATION_FILE.match(filename)
+            if match:
+                migrations.append(Migration(int(match.group(1)),
+                                            match.group(2),
+                                            os.path.join(self.path, filename)))
+        return sorted(migrations, key=lambda m: m.version)
+
+    def _execute(self, query, data=None):
+        return self.engine.execute(self.engine.translate(query), data)
+
+    def applied(self):
+        self._execute(CREATE_VERSION_TABLE)
+        return {row[0] for row in self._execute(SELECT_VERSIONS)}
+
+    def pending(self):
+        applied = self.applied()
+        return [m for m in self.migrations() if m.version not in applied]
+
+    def migrate(self):
+        """
+        Apply every pending migration.  This blocks.
+
+        :return: The migrations which were applied
+        """
+        pending = self.pending()
+
+        for migration in pending:
+            print(f'Applying migration {migration}')
+
+            # Run on one connection, so session variables carry
+            # from one statement to the next, and recorded with it.
+            now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+            statements = [(self.engine.translate(statement), None, False)
+                          for statement in migration.statements()]
+            statements.append((self.engine.translate(INSERT_VERSION),
+                               (migration.version, migration.name, now),
+                               False))
+            self.engine.execute_batch(statements)
+        return pending
@@ -0,0 +1,278 @@
+from dotenv import load_dotenv
+from functools import partial
+
+from mysql.connector.errors import Error, InterfaceError
+from .batch import resolve
+from .pool import ConnectionPool
+from .queries import statement_catalogue
+from .statements import PreparedStatements
+from .storageengine import PlanStep, StorageEngine
+import mysql.connector
+import os
+
+# Default pool bounds and timeouts, in seconds
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+POOL_TIMEOUT = 10
+POOL_IDLE_TIMEOUT = 300
+
+
+class MySQLEngine(StorageEngine):
+    """
+    Storage engine backed by a MySQL connection pool.
+
+    Connection details and pool bounds are read from the environment.
+    """
+
+    name = 'mysql'
+
+    def __init__(self, prepared=None, host=None, port=None):
+
+        # Load environment details
+        load_dotenv()
+
+        # Set connections details.  Replicas share everything
+        # but the host with the primary.
+        self.host = host if host is not None else os.getenv('DB_HOST')
+        self.port = port
+        self.dbName = os.getenv('DB_NAME')
+        self.user = os.getenv('DB_USER')
+        self.passw = os.getenv('DB_PASS')
+
+        # Pool bounds.  The executor is sized to the upper bound.
+        self.min_size = int(os.getenv('DB_POOL_MIN', POOL_MIN_SIZE))
+        self.pool_size = int(os.getenv('DB_POOL_MAX', POOL_MAX_SIZE))
+        self.timeout = float(os.getenv('DB_POOL_TIMEOUT', POOL_TIMEOUT))
+        self.idle_timeout = float(
+            os.getenv('DB_POOL_IDLE_TIMEOUT', POOL_IDLE_TIMEOUT))
+
+        # Run catalogue statements as server-side prepared statements
+        if prepared is None:
+            prepared = os.getenv('DB_PREPARED', '').lower() in ('1', 'true')
+        self.statements = None
+        if prepared:
+            self.statements = PreparedStatements(
+                statement_catalogue().values())
+
+        # Create the connection pool
+        self._create_pool()
+
+    def _create_pool(self):
+
+        # Database login details
+        temp = {
+            'host': self.host,
+            'database': self.dbName,
+            'user': self.user,
+            'password': self.passw,
+            'autocommit': True
+        }
+        if self.port is not None:
+            temp['port'] = self.port
+
+        # Create the pool
+        self.pool = ConnectionPool(partial(mysql.connector.connect, **temp),
+                                   validate=self._is_alive,
+                                   close=self._close_connection,
+                                   min_size=self.min_size,
+                                   max_size=self.pool_size,
+                                   timeout=self.timeout,
+                                   idle_timeout=self.idle_timeout)
+
+    @staticmethod
+    def _is_alive(connection):
+        try:
+            return connection.is_connected()
+        except Error:
+            return False
+
+    def _close_connection(self, connection):
+        if self.statements is not None:
+            self.statements.forget(connection)
+
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def _get_connection(self):
+        """
+        Returns a connection from the connections
+        pool.
+        :return: `mysql.connection`
+        """
+        return self.pool.get()
+
+    def _release(self, connection, broken=False):
+        self.pool.put(connection, broken)
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def execute(self, query, data=None, lastrowid=False):
+        """
+        Performs a full unit of work on the database.  The connection
+        is acquired, the query executed, the results fetched and the
+        connection released all on the calling thread.
+
+        A read which fails because its connection died is tried
+        once more on a fresh connection.
+
+        :return: `[(data), (data)]` or the last row id
+        """
+        is_read = query.lstrip()[:6].upper() == 'SELECT'
+        return self._execute(query, data, lastrowid, retry=is_read)
+
+    def _execute(self, query, data, lastrowid, retry):
+        connection = self.acquire()
+        broken = False
+        try:
+            cursor = None
+            if self.statements is not None:
+                cursor = self.statements.cursor(connection, query)
+
+            # Prepared cursors stay open for the next call
+            if cursor is not None:
+                return self._cursor_execute(cursor, query, data, lastrowid)
+
+            cursor = connection.cursor()
+            try:
+                return self._cursor_execute(cursor, query, data, lastrowid)
+            finally:
+                cursor.close()
+
+        except Error:
+            broken = not self._is_alive(connection)
+            if not (broken and retry):
+                raise
+
+        finally:
+            # Release the connection back to the pool
+            self.release(connection, broken)
+
+        return self._execute(query, data, lastrowid, retry=False)
+
+    def _cursor_execute(self, cursor, query, data, lastrowid):
+        cursor.execute(query, data)
+
+        if lastrowid:
+            return cursor.lastrowid
+
+        # Statements without a result set have nothing to fetch
+        try:
+            return cursor.fetchall()
+        except InterfaceError:
+            return cursor.lastrowid
+
+    def executemany(self, query, rows):
+        """
+        Execute a statement once for every row on a single connection.
+
+        :return: The number of rows affected
+        """
+        connection = self.acquire()
+        broken = False
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(query, rows)
+                return cursor.rowcount
+            finally:
+                cursor.close()
+        except Error:
+            broken = not self._is_alive(connection)
+            raise
+        finally:
+            self.release(connection, broken)
+
+    def stream(self, query, data=None, size=1000):
+        """
+        Rows are read from an unbuffered cursor, so the server sends
+        them as they are fetched rather than all at once.
+        """
+        connection = self.acquire()
+        broken = False
+        finished = False
+        try:
+            cursor = connection.cursor(buffered=False)
+            try:
+                cursor.execute(query, data)
+
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if len(rows) == 0:
+                        finished = True
+                        return
+                    yield rows
+            finally:
+                # Unread rows leave the connection unusable
+                if finished:
+                    cursor.close()
+
+        except Error:
+            broken = not self._is_alive(connection)
+            raise
+
+        finally:
+            self.release(connection, broken or not finished)
+
+    def execute_batch(self, statements):
+        connection = self.acquire()
+        broken = False
+        try:
+            connection.start_transaction()
+            try:
+                results = []
+                cursor = connection.cursor()
+                try:
+                    for query, data, many in statements:
+                        if many:
+                            cursor.executemany(query, data)
+                            results.append(cursor.rowcount)
+                        else:
+                            cursor.execute(query, resolve(data, results))
+                            results.append(cursor.lastrowid)
+                finally:
+                    cursor.close()
+
+                connection.commit()
+            except BaseException:
+                if self._is_alive(connection):
+                    connection.rollback()
+                raise
+            return results
+
+        except Error:
+            broken = not self._is_alive(connection)
+            raise
+
+        finally:
+            self.release(connection, broken)
+
+    def explain(self, query, data=None):
+        connection = self.acquire()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute('EXPLAIN ' + query, data)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            self.release(connection)
+
+        steps = []
+        for row in rows:
+            extra = row.get('Extra') or ''
+            steps.append(PlanStep(
+                table=row['table'],
+                # `index` reads the whole index, `ALL` the whole table
+                full_scan=row['type'] in ('ALL', 'index'),
+                index=row['key'],
+                covering='Using index' in extra or row['key'] == 'PRIMARY',
+                detail=f'{row["table"]}: type={row["type"]} '
+                       f'key={row["key"]} rows={row["rows"]} {extra}'))
+        return steps
+
+    def close(self):
+        self.pool.close()
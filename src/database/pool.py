@@ -0,0 +1,169 @@
+import collections
+import threading
+import time
+
+
+class PoolTimeoutError(Exception):
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        super().__init__(
+            f'No database connection became free within {timeout}s.')
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool which sizes itself to demand.
+
+    The pool holds at least `min_size` connections and opens more, up
+    to `max_size`, while every open connection is busy.  Past that,
+    callers wait in line for up to `timeout` seconds.  Connections
+    idle for longer than `idle_timeout` are closed again until only
+    `min_size` remain.
+
+    A connection which has been idle for more than `validate_after`
+    seconds is checked with `validate()` before it is handed out and
+    is replaced if it has gone stale, for example after the database
+    restarted.
+    """
+
+    def __init__(self, connect, validate, close, min_size=1, max_size=10,
+                 timeout=10, idle_timeout=300, validate_after=5):
+        self._connect = connect
+        self._validate = validate
+        self._close = close
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.validate_after = validate_after
+
+        # (connection, time returned), most recently used last
+        self._idle = collections.deque()
+        self._open = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+
+        for _ in range(min_size):
+            self._idle.append((connect(), time.monotonic()))
+            self._open += 1
+
+        # Idle connections are closed even when nothing uses the pool
+        self._closed = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_idle,
+                                        name='hermes_db_pool', daemon=True)
+        self._reaper.start()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'open': self._open,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+    def get(self):
+        """
+        Check a connection out of the pool, waiting for one to be
+        returned if the pool is at its limit.
+
+        :return: A connection which must be given back with `put()`
+        """
+        deadline = time.monotonic() + self.timeout
+
+        with self._condition:
+            while True:
+                if len(self._idle) > 0:
+                    # Reusing the most recent connection lets the
+                    # others go idle long enough to be closed.
+                    connection, returned = self._idle.pop()
+                    break
+
+                if self._open < self.max_size:
+                    self._open += 1
+                    connection = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(self.timeout)
+
+                self._waiting += 1
+                try:
+                    self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        # Connecting and validating happen outside of the lock
+        try:
+            if connection is None:
+                return self._connect()
+
+            if time.monotonic() - returned > self.validate_after:
+                if not self._validate(connection):
+                    self._close(connection)
+                    return self._connect()
+            return connection
+
+        except BaseException:
+            self._discard()
+            raise
+
+    def put(self, connection, broken=False):
+        """
+        Return a connection to the pool.  Broken connections, and
+        any returned once the pool is closed, are closed and their
+        place freed.
+        """
+        if not broken:
+            # Checked under the lock, so `close()` either drains
+            # the connection or it is closed here.
+            with self._condition:
+                if not self._closed.is_set():
+                    self._idle.append((connection, time.monotonic()))
+                    self._condition.notify()
+                    return
+
+        self._close(connection)
+        self._discard()
+
+    def _discard(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    def shrink(self):
+        """
+        Close connections which have been idle for too long.
+        """
+        expired = []
+        now = time.monotonic()
+
+        with self._condition:
+            # The oldest connections are at the front
+            while (self._open > self.min_size and len(self._idle) > 0
+                   and now - self._idle[0][1] > self.idle_timeout):
+                expired.append(self._idle.popleft()[0])
+                self._open -= 1
+
+        for connection in expired:
+            self._close(connection)
+
+    def _reap_idle(self):
+        interval = max(1, self.idle_timeout / 2)
+
+        while not self._closed.wait(interval):
+            self.shrink()
+
+    def close(self):
+        self._closed.set()
+
+        with self._condition:
+            idle, self._idle = self._idle, collections.deque()
+            self._open -= len(idle)
+
+        for connection, _ in idle:
+            self._close(connection)
@@ -0,0 +1,118 @@
+class DatabaseQuery:
+
+    SELECT_GUILD_SETTINGS = 'SELECT * FROM guild_settings WHERE idguild=%s'
+    SELECT_GUILD_USERS = 'SELECT * FROM users WHERE idguild=%s'
+
+    SELECT_QUOTES_GUILD = 'SELECT * FROM user_quotes WHERE idguild=%s ORDER BY idquote'  # noqa
+    SELECT_QUOTES_GUILD_AFTER = 'SELECT * FROM user_quotes WHERE idguild=%s AND idquote>%s ORDER BY idquote LIMIT %s'  # noqa
+    SELECT_QUOTES_GUILD_BEFORE = 'SELECT * FROM user_quotes WHERE idguild=%s AND idquote<%s ORDER BY idquote DESC LIMIT %s'  # noqa
+    SELECT_QUOTES_GUILD_LAST = 'SELECT * FROM user_quotes WHERE idguild=%s ORDER BY idquote DESC LIMIT %s'  # noqa
+    SELECT_QUOTES_GUILD_COUNT = 'SELECT COUNT(*) FROM user_quotes WHERE idguild=%s'  # noqa
+    SELECT_QUOTE_USER = 'SELECT * FROM user_quotes WHERE idguild=%s AND username=%s'  # noqa
+    SELECT_QUOTE_ID = 'SELECT * FROM user_quotes WHERE idguild=%s AND idquote=%s'  # noqa
+
+    SELECT_GUILD_TTS = 'SELECT idquote, file_name FROM quotes as q INNER JOIN tts_file_references as t ON q.idquote = t.quote_id WHERE q.idguild = %s'  # noqa
+    SELECT_GUILD_TTS_COUNT = 'SELECT COUNT(*) FROM quotes as q INNER JOIN tts_file_references as t ON q.idquote = t.quote_id WHERE q.idguild = %s'  # noqa
+    SELECT_GUILD_TTS_OFFSET = 'SELECT idquote, file_name FROM quotes as q INNER JOIN tts_file_references as t ON q.idquote = t.quote_id WHERE q.idguild = %s ORDER BY q.idquote LIMIT 1 OFFSET %s'  # noqa
+    SELECT_ID_TTS = 'SELECT * FROM tts_file_references WHERE quote_id=%s'
+
+    # Formatted with one `%s` per file name
+    SELECT_TTS_FILES_REFERENCED = 'SELECT DISTINCT file_name FROM tts_file_references WHERE file_name IN ({})'  # noqa
+
+    # Bounds of the next chunk of a TTS backfill
+    SELECT_QUOTE_ID_AFTER = 'SELECT idquote FROM quotes WHERE idquote>%s ORDER BY idquote LIMIT 1 OFFSET %s'  # noqa
+    SELECT_LAST_QUOTE_ID = 'SELECT MAX(idquote) FROM quotes'
+    SELECT_TTS_BACKFILL = 'SELECT last_quote, running FROM tts_backfill WHERE id=1'  # noqa
+    SELECT_QUOTE_COUNT = 'SELECT COUNT(*) from quotes WHERE idguild=%s'
+
+    # TTS jobs which are due, most urgent first
+    SELECT_DUE_TTS_JOBS = 'SELECT j.quote_id, q.idguild, q.quote_data, j.priority, j.attempts FROM tts_jobs AS j INNER JOIN quotes AS q ON q.idquote = j.quote_id WHERE j.dead=0 AND j.next_attempt<=%s ORDER BY j.priority, j.next_attempt LIMIT %s'  # noqa
+    SELECT_DEAD_TTS_JOBS = 'SELECT j.quote_id, q.idguild, j.attempts, j.last_error FROM tts_jobs AS j INNER JOIN quotes AS q ON q.idquote = j.quote_id WHERE j.dead=1 ORDER BY j.quote_id LIMIT %s'  # noqa
+    SELECT_TTS_JOB_COUNTS = 'SELECT dead, COUNT(*) FROM tts_jobs GROUP BY dead'  # noqa
+
+    SELECT_EXPORT_QUOTES = 'SELECT q.idquote, q.iduser, q.quote_data, q.quote_date, t.file_name FROM user_quotes AS q LEFT JOIN tts_file_references AS t ON t.quote_id = q.idquote WHERE q.idguild=%s ORDER BY q.idquote'  # noqa
+
+    SELECT_QUOTE_STATS_USERS = 'SELECT u.username, s.quote_count FROM quote_user_stats AS s INNER JOIN users AS u ON u.idguild = s.idguild AND u.iduser = s.iduser WHERE s.idguild=%s AND s.quote_count>0 ORDER BY s.quote_count DESC'  # noqa
+    SELECT_QUOTE_STATS_MONTH = 'SELECT u.username, s.quote_count FROM quote_month_stats AS s INNER JOIN users AS u ON u.idguild = s.idguild AND u.iduser = s.iduser WHERE s.idguild=%s AND s.quote_month=%s AND s.quote_count>0 ORDER BY s.quote_count DESC'  # noqa
+
+
+class DatabaseUpdate:
+
+    REPLACE_GUILD_SETTINGS = 'INSERT INTO guild_settings (idguild, volumem, volumeq, playlist, tts_engine) VALUES {} ON DUPLICATE KEY UPDATE volumem=VALUES(volumem), volumeq=VALUES(volumeq), playlist=VALUES(playlist), tts_engine=VALUES(tts_engine)'  # noqa
+    REPLACE_GUILD_SETTINGS_ROW = '(%s, %s, %s, %s, %s)'
+
+    INSERT_GUILD_USER = 'INSERT INTO users (idguild, username) VALUES (%s, %s)'
+    INSERT_GUILD_QUOTE = 'INSERT INTO quotes (idguild, iduser, quote_data, quote_date) VALUES (%s, %s, %s, %s)'  # noqa
+    INSERT_TTS_FILE = 'INSERT INTO tts_file_references (quote_id, file_name) VALUES (%s, %s)'  # noqa
+
+    INSERT_TTS_FILE_MISSING = 'INSERT INTO tts_file_references (quote_id, file_name) SELECT q.idquote, %s FROM quotes AS q LEFT JOIN tts_file_references AS t ON t.quote_id = q.idquote WHERE q.idquote=%s AND t.quote_id IS NULL'  # noqa
+
+    # TTS jobs.  A job is deleted in the batch which stores its file.
+    INSERT_TTS_JOB = 'INSERT INTO tts_jobs (quote_id, priority, next_attempt) VALUES (%s, %s, %s)'  # noqa
+    INSERT_TTS_JOB_MISSING = 'INSERT INTO tts_jobs (quote_id, priority, next_attempt) SELECT q.idquote, %s, %s FROM quotes AS q LEFT JOIN tts_jobs AS j ON j.quote_id = q.idquote WHERE q.idquote=%s AND j.quote_id IS NULL'  # noqa
+    INSERT_TTS_JOBS_MISSING = 'INSERT INTO tts_jobs (quote_id, priority, next_attempt) SELECT q.idquote, 1, %s FROM quotes AS q LEFT JOIN tts_file_references AS t ON t.quote_id = q.idquote LEFT JOIN tts_jobs AS j ON j.quote_id = q.idquote WHERE q.idquote>%s AND q.idquote<=%s AND t.quote_id IS NULL AND j.quote_id IS NULL'  # noqa
+    UPDATE_TTS_BACKFILL = 'UPDATE tts_backfill SET last_quote=%s, running=%s WHERE id=1'  # noqa
+    PRIORITIZE_TTS_JOB = 'UPDATE tts_jobs SET priority=%s WHERE quote_id=%s AND priority>%s'  # noqa
+    RETRY_TTS_JOB = 'UPDATE tts_jobs SET attempts=%s, next_attempt=%s, last_error=%s, dead=%s WHERE quote_id=%s'  # noqa
+    REVIVE_TTS_JOB = 'UPDATE tts_jobs SET attempts=0, dead=0, next_attempt=%s WHERE quote_id=%s AND dead=1'  # noqa
+    REVIVE_ALL_TTS_JOBS = 'UPDATE tts_jobs SET attempts=0, dead=0, next_attempt=%s WHERE dead=1'  # noqa
+    DELETE_TTS_JOB = 'DELETE FROM tts_jobs WHERE quote_id=%s'
+    DELETE_DEAD_TTS_JOBS = 'DELETE FROM tts_jobs WHERE dead=1'
+
+    # Quote statistics.  Counts are added to, rather than replaced, so
+    # one statement serves a single quote and a batch of them.
+    UPSERT_QUOTE_USER_STATS = 'INSERT INTO quote_user_stats (idguild, iduser, quote_count) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE quote_count=quote_count+VALUES(quote_count)'  # noqa
+    UPSERT_QUOTE_MONTH_STATS = 'INSERT INTO quote_month_stats (idguild, quote_month, iduser, quote_count) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE quote_count=quote_count+VALUES(quote_count)'  # noqa
+
+    # Run before the quote is deleted, in the same batch
+    DECREMENT_QUOTE_USER_STATS = 'UPDATE quote_user_stats SET quote_count=quote_count-1 WHERE idguild=%s AND iduser=(SELECT iduser FROM quotes WHERE idguild=%s AND idquote=%s)'  # noqa
+    DECREMENT_QUOTE_MONTH_STATS = 'UPDATE quote_month_stats SET quote_count=quote_count-1 WHERE idguild=%s AND quote_month=(SELECT SUBSTR(quote_date, 1, 7) FROM quotes WHERE idguild=%s AND idquote=%s) AND iduser=(SELECT iduser FROM quotes WHERE idguild=%s AND idquote=%s)'  # noqa
+
+    # Rebuild the statistics of one guild from its quotes
+    DELETE_QUOTE_USER_STATS = 'DELETE FROM quote_user_stats WHERE idguild=%s'  # noqa
+    DELETE_QUOTE_MONTH_STATS = 'DELETE FROM quote_month_stats WHERE idguild=%s'  # noqa
+    COUNT_QUOTE_USER_STATS = 'INSERT INTO quote_user_stats (idguild, iduser, quote_count) SELECT idguild, iduser, COUNT(*) FROM quotes WHERE idguild=%s GROUP BY idguild, iduser'  # noqa
+    COUNT_QUOTE_MONTH_STATS = 'INSERT INTO quote_month_stats (idguild, quote_month, iduser, quote_count) SELECT idguild, SUBSTR(quote_date, 1, 7), iduser, COUNT(*) FROM quotes WHERE idguild=%s GROUP BY idguild, SUBSTR(quote_date, 1, 7), iduser'  # noqa
+
+    # Rebuild the statistics of every guild
+    DELETE_ALL_QUOTE_USER_STATS = 'DELETE FROM quote_user_stats'
+    DELETE_ALL_QUOTE_MONTH_STATS = 'DELETE FROM quote_month_stats'
+    COUNT_ALL_QUOTE_USER_STATS = 'INSERT INTO quote_user_stats (idguild, iduser, quote_count) SELECT idguild, iduser, COUNT(*) FROM quotes GROUP BY idguild, iduser'  # noqa
+    COUNT_ALL_QUOTE_MONTH_STATS = 'INSERT INTO quote_month_stats (idguild, quote_month, iduser, quote_count) SELECT idguild, SUBSTR(quote_date, 1, 7), iduser, COUNT(*) FROM quotes GROUP BY idguild, SUBSTR(quote_date, 1, 7), iduser'  # noqa
+
+    DELETE_GUILD_QUOTE = 'DELETE FROM quotes WHERE idguild=%s AND idquote=%s'  # noqa
+
+    REMOVE_QUOTE_USER = 'UPDATE quotes SET iduser=-1 WHERE idguild=%s AND iduser=%s'  # noqa
+    DELETE_GUILD_USER = 'DELETE FROM users WHERE idguild=%s AND iduser=%s'
+
+
+def statement_catalogue():
+    """
+    Returns every statement in `DatabaseQuery` and `DatabaseUpdate`
+    which can be prepared.  Templates which are formatted before
+    use are left out.
+
+    :return: `{name: query}`
+    """
+    catalogue = {}
+
+    for cls in (DatabaseQuery, DatabaseUpdate):
+        for name, query in vars(cls).items():
+            if name.isupper() and '{}' not in query:
+                catalogue[name] = query
+    return catalogue
+
+
+def statement_names():
+    """
+    Returns the name of every statement, templates included.
+
+    :return: `{query: name}`
+    """
+    names = {}
+
+    for cls in (DatabaseQuery, DatabaseUpdate):
+        for name, query in vars(cls).items():
+            if name.isupper():
+                names[query] = name
+    return names
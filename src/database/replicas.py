@@ -0,0 +1,102 @@
+import threading
+import time
+
+# Seconds a failed replica is left alone before it is tried again
+RETRY_AFTER = 30
+
+
+class Replica:
+    """
+    A read replica.  The engine is created on first use so a
+    replica which is down when the bot starts is picked up later.
+    """
+
+    def __init__(self, name, create):
+        self.name = name
+        self.create = create
+        self.engine = None
+        self.down_until = 0
+
+        # Held while the engine is created, so two threads never
+        # both open a pool for it.
+        self.lock = threading.Lock()
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+
+class ReplicaSet:
+    """
+    Read replicas used in turn.  A replica which fails a health
+    check is skipped for `retry_after` seconds.
+    """
+
+    def __init__(self, replicas, retry_after=RETRY_AFTER):
+        self.replicas = list(replicas)
+        self.retry_after = retry_after
+
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.replicas)
+
+    def _mark_down(self, replica, error):
+        print(f'Database replica {replica.name} is unavailable: {error}')
+        replica.down_until = time.monotonic() + self.retry_after
+
+    def pick(self):
+        """
+        :return: `(Replica(), StorageEngine())` of the next healthy
+                 replica, or `None` when none are available
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            candidates = [self.replicas[(self._next + i) % len(self.replicas)]
+                          for i in range(len(self.replicas))]
+            self._next = (self._next + 1) % len(self.replicas)
+
+        for replica in candidates:
+            if not replica.healthy(now):
+                continue
+
+            with replica.lock:
+                if replica.engine is None:
+                    try:
+                        replica.engine = replica.create()
+                    except Exception as e:
+                        self._mark_down(replica, e)
+                        continue
+
+            return replica, replica.engine
+        return None
+
+    def check(self, replica, error):
+        """
+        Health check a replica after a statement on it failed.
+
+        :return: `True` if the replica is still usable, in which
+                 case the statement itself was at fault
+        """
+        if replica.engine.ping():
+            return True
+
+        self._mark_down(replica, error)
+        return False
+
+    def stats(self):
+        now = time.monotonic()
+        stats = {}
+        for replica in self.replicas:
+            stats[replica.name] = {
+                'healthy': replica.healthy(now),
+                'pool': (replica.engine.pool_stats()
+                         if replica.engine is not None else None),
+            }
+        return stats
+
+    def close(self):
+        for replica in self.replicas:
+            if replica.engine is not None:
+                replica.engine.close()
@@ -0,0 +1,174 @@
+from .batch import resolve
+from .queries import DatabaseUpdate
+from .storageengine import PlanStep, StorageEngine
+
+from functools import lru_cache
+
+import queue
+import re
+import sqlite3
+
+# `SCAN q`, `SEARCH t USING COVERING INDEX tts_quote_file (quote_id=?)`
+PLAN_DETAIL = re.compile(
+    r'^(SCAN|SEARCH) (\w+)(?: USING (COVERING )?(?:INDEX (\w+)|(INTEGER PRIMARY KEY)))?')  # noqa
+
+# Readers never block each other in WAL mode, so a few connections
+# let reads run alongside a write.
+POOL_SIZE = 4
+
+# Statements which use MySQL only syntax
+DIALECT = {
+    DatabaseUpdate.REPLACE_GUILD_SETTINGS: 'INSERT INTO guild_settings (idguild, volumem, volumeq, playlist, tts_engine) VALUES {} ON CONFLICT (idguild) DO UPDATE SET volumem=excluded.volumem, volumeq=excluded.volumeq, playlist=excluded.playlist, tts_engine=excluded.tts_engine',  # noqa
+    DatabaseUpdate.UPSERT_QUOTE_USER_STATS: 'INSERT INTO quote_user_stats (idguild, iduser, quote_count) VALUES (%s, %s, %s) ON CONFLICT (idguild, iduser) DO UPDATE SET quote_count=quote_count+excluded.quote_count',  # noqa
+    DatabaseUpdate.UPSERT_QUOTE_MONTH_STATS: 'INSERT INTO quote_month_stats (idguild, quote_month, iduser, quote_count) VALUES (%s, %s, %s, %s) ON CONFLICT (idguild, quote_month, iduser) DO UPDATE SET quote_count=quote_count+excluded.quote_count',  # noqa
+}
+
+
+@lru_cache(maxsize=512)
+def _translate(query):
+    # Bounded, since statements built with `.format()` differ by
+    # their number of placeholders.
+    return DIALECT.get(query, query).replace('%s', '?')
+
+
+class SQLiteEngine(StorageEngine):
+    """
+    Storage engine backed by an embedded SQLite database.
+
+    The database runs in WAL mode so reads are not blocked by a
+    write.  Passing `':memory:'` creates a private in-memory
+    database, which is served by a single connection.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+
+        if path == ':memory:':
+            self.pool_size = 1
+        else:
+            self.pool_size = POOL_SIZE
+
+        self._pool = queue.Queue()
+
+        for _ in range(self.pool_size):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        # Autocommit mode, matching the MySQL connections
+        connection = sqlite3.connect(self.path, isolation_level=None,
+                                     check_same_thread=False)
+
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        connection.execute('PRAGMA busy_timeout=5000')
+        return connection
+
+    def _get_connection(self):
+        return self._pool.get()
+
+    def _release(self, connection, broken=False):
+        self._pool.put(connection)
+
+    def translate(self, query):
+        return _translate(query)
+
+    def execute(self, query, data=None, lastrowid=False):
+        connection = self.acquire()
+        try:
+            cursor = connection.execute(
+                query, data if data is not None else ())
+            try:
+                # Statements without a result set have nothing to fetch
+                if lastrowid or cursor.description is None:
+                    return cursor.lastrowid
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        finally:
+            self.release(connection)
+
+    def executemany(self, query, rows):
+        connection = self.acquire()
+        try:
+            # One transaction for the whole batch rather than
+            # a commit for every row.
+            connection.execute('BEGIN')
+            try:
+                cursor = connection.executemany(query, rows)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            return cursor.rowcount
+        finally:
+            self.release(connection)
+
+    def stream(self, query, data=None, size=1000):
+        connection = self.acquire()
+        try:
+            cursor = connection.execute(
+                query, data if data is not None else ())
+            try:
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if len(rows) == 0:
+                        return
+                    yield rows
+            finally:
+                cursor.close()
+        finally:
+            self.release(connection)
+
+    def execute_batch(self, statements):
+        connection = self.acquire()
+        try:
+            connection.execute('BEGIN')
+            try:
+                results = []
+
+                for query, data, many in statements:
+                    if many:
+                        cursor = connection.executemany(query, data)
+                        results.append(cursor.rowcount)
+                    else:
+                        data = resolve(data, results)
+                        cursor = connection.execute(
+                            query, data if data is not None else ())
+                        results.append(cursor.lastrowid)
+
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            return results
+        finally:
+            self.release(connection)
+
+    def explain(self, query, data=None):
+        rows = self.execute('EXPLAIN QUERY PLAN ' + query, data)
+        steps = []
+
+        for row in rows:
+            detail = row[3]
+            match = PLAN_DETAIL.match(detail)
+
+            # Sorting, subqueries and the like are not table accesses
+            if match is None:
+                continue
+
+            index = match.group(4) or match.group(5)
+            steps.append(PlanStep(
+                table=match.group(2),
+                full_scan=match.group(1) == 'SCAN' and index is None,
+                index=index,
+                covering=(match.group(3) is not None
+                          or match.group(5) is not None),
+                detail=detail))
+        return steps
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
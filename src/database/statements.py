@@ -0,0 +1,55 @@
+import threading
+import weakref
+
+
+class PreparedStatements:
+    """
+    Registry of server-side prepared statements.
+
+    Each connection in the pool gets its own prepared cursor for
+    every catalogue statement it runs.  A cursor is created (and the
+    statement prepared on the server) the first time a connection
+    runs that statement, after which every call only sends the
+    parameters.
+
+    Statements outside of the catalogue return `None` and should
+    be run as plain text queries.
+    """
+
+    def __init__(self, statements):
+        self.statements = frozenset(statements)
+
+        self._cursors = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def cursor(self, connection, query):
+        """
+        Returns the prepared cursor for `query` on `connection`.
+
+        :return: `MySQLCursorPrepared` or `None`
+        """
+        if query not in self.statements:
+            return None
+
+        with self._lock:
+            cursors = self._cursors.setdefault(connection, {})
+
+        cursor = cursors.get(query)
+        if cursor is None:
+            cursor = connection.cursor(prepared=True)
+            cursors[query] = cursor
+        return cursor
+
+    def forget(self, connection):
+        """
+        Drop every cursor of a connection.  Used when the connection
+        fails since its statements may no longer exist on the server.
+        """
+        with self._lock:
+            cursors = self._cursors.pop(connection, {})
+
+        for cursor in cursors.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
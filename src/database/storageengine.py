@@ -0,0 +1,200 @@
+from dotenv import load_dotenv
+from functools import partial
+
+from .replicas import RETRY_AFTER, Replica, ReplicaSet
+import os
+import time
+
+
+class StorageEngine:
+    """
+    Interface between `DatabaseManager` and a database.
+
+    Every method blocks and is only ever called from the database
+    executor.  Statements are written for MySQL with `%s`
+    placeholders; engines for other databases translate them in
+    `translate()`.
+    """
+
+    name = None
+
+    # Number of connections the engine can use at once.  The
+    # database executor is sized to match.
+    pool_size = 1
+
+    # Set by `DatabaseManager` to record pool usage
+    metrics = None
+
+    def _get_connection(self):
+        raise NotImplementedError
+
+    def _release(self, connection, broken=False):
+        raise NotImplementedError
+
+    def acquire(self):
+        """
+        Check a connection out of the pool.
+
+        :return: A connection which must be given back with `release()`
+        """
+        started = time.perf_counter()
+        connection = self._get_connection()
+
+        if self.metrics is not None:
+            self.metrics.checked_out(time.perf_counter() - started)
+        return connection
+
+    def release(self, connection, broken=False):
+        """
+        Give a connection back to the pool.  A broken connection
+        is closed rather than reused.
+        """
+        try:
+            self._release(connection, broken)
+        finally:
+            if self.metrics is not None:
+                self.metrics.checked_in()
+
+    def pool_stats(self):
+        """
+        :return: A dictionary describing the connection pool
+        """
+        return {'max_size': self.pool_size}
+
+    def translate(self, query):
+        """
+        Convert a catalogue statement into the engine's dialect.
+        """
+        return query
+
+    def execute(self, query, data=None, lastrowid=False):
+        """
+        Acquire a connection, execute the query, fetch the results
+        and release the connection.
+
+        :return: `[(data), (data)]` or the last row id
+        """
+        raise NotImplementedError
+
+    def executemany(self, query, rows):
+        """
+        Execute a statement once for every row on a single connection.
+
+        :return: The number of rows affected
+        """
+        raise NotImplementedError
+
+    def stream(self, query, data=None, size=1000):
+        """
+        Generator which yields the rows of a query `size` at a time
+        without holding the whole result in memory.  The connection
+        is held until the generator is exhausted or closed.
+
+        :return: `[(data), (data)]` for each chunk
+        """
+        raise NotImplementedError
+
+    def execute_batch(self, statements):
+        """
+        Run `[(query, data, many)]` on one connection as a single
+        transaction.  Either every statement is committed or none are.
+        Batches are for writes; result sets are not fetched.
+
+        :return: A result for each statement, the last row id for
+                 single statements and the row count for `many`
+        """
+        raise NotImplementedError
+
+    def ping(self):
+        """
+        :return: `True` if the database answers a trivial query
+        """
+        try:
+            self.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def explain(self, query, data=None):
+        """
+        Describe how the database runs a query.
+
+        :return: `[PlanStep()]`
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PlanStep:
+    """
+    One table access in a query plan.
+
+    `covering` is set when the rows are reached without a second
+    lookup, either from an index alone or by searching the
+    primary key the table is stored in.
+    """
+
+    def __init__(self, table, full_scan, index, covering, detail):
+        self.table = table
+        self.full_scan = full_scan
+        self.index = index
+        self.covering = covering
+        self.detail = detail
+
+    def __str__(self):
+        return self.detail
+
+
+def create_engine(name=None):
+    """
+    Create the storage engine named by `name`, or by the `DB_ENGINE`
+    environment variable.  MySQL is used when neither is set.
+
+    :return: `StorageEngine()`
+    """
+    load_dotenv()
+
+    if name is None:
+        name = os.getenv('DB_ENGINE', 'mysql')
+    name = name.lower()
+
+    # Engines are imported here so only the driver in use
+    # needs to be installed.
+    if name == 'mysql':
+        from .mysqlengine import MySQLEngine
+        return MySQLEngine()
+    elif name == 'sqlite':
+        from .sqliteengine import SQLiteEngine
+        return SQLiteEngine(os.getenv('DB_PATH', 'hermes.db'))
+
+    raise Exception(f'Unknown database engine: {name}')
+
+
+def create_replicas(engine):
+    """
+    Create the read replicas listed in the `DB_REPLICAS` environment
+    variable as comma separated `host` or `host:port` entries.  Only
+    MySQL supports replicas.
+
+    :return: `ReplicaSet()` or `None` when there are none
+    """
+    load_dotenv()
+
+    hosts = [host.strip() for host in os.getenv('DB_REPLICAS', '').split(',')
+             if host.strip() != '']
+    if len(hosts) == 0 or engine.name != 'mysql':
+        return None
+
+    from .mysqlengine import MySQLEngine
+
+    replicas = []
+    for host in hosts:
+        host, _, port = host.partition(':')
+        create = partial(MySQLEngine, prepared=engine.statements is not None,
+                         host=host, port=int(port) if port else None)
+        replicas.append(Replica(host + (f':{port}' if port else ''), create))
+
+    return ReplicaSet(replicas,
+                      float(os.getenv('DB_REPLICA_RETRY', RETRY_AFTER)))
@@ -0,0 +1,79 @@
+from .cache import LRUCache
+
+
+class GuildUsers:
+    """
+    The users of one guild.  `rows` are kept as the database returned
+    them, and names are indexed casefolded for lookups.  Names which
+    only differ by case share a key, so each key holds a list.
+    """
+
+    def __init__(self, rows, key):
+        self.rows = list(rows)
+        self.names = {}
+        for row in self.rows:
+            self.names.setdefault(key(row[2]), []).append(row)
+
+
+class UserDirectory:
+    """
+    In-process cache of the users in each guild.
+
+    Users are keyed by their casefolded name so a lookup is a
+    single dictionary access instead of a scan over every row.
+    Guilds are held in an LRU so quiet guilds fall out of memory.
+
+    Writes never update an entry in place.  The guild is dropped
+    and reloaded from the database on its next lookup.
+    """
+
+    def __init__(self, max_guilds=256):
+        self._guilds = LRUCache(max_guilds)
+
+        # Bumped on every invalidation.  A load which started before
+        # an invalidation must not store its (now stale) rows.
+        self._version = 0
+
+    @staticmethod
+    def _key(username):
+        return username.casefold()
+
+    def version(self):
+        return self._version
+
+    def get(self, guildid):
+        """
+        :return: `GuildUsers()` or `None` if the guild is not cached
+        """
+        return self._guilds.get(guildid)
+
+    def load(self, guildid, rows, version):
+        """
+        Store the users of a guild.
+
+        :param version: value of `version()` before the rows were fetched
+        :return: `GuildUsers()`
+        """
+        users = GuildUsers(rows, self._key)
+
+        if version == self._version:
+            self._guilds.put(guildid, users)
+        return users
+
+    def find(self, users, username):
+        """
+        :return: The user named exactly `username`, otherwise the
+                 first whose name only differs by case, or `None`
+        """
+        rows = users.names.get(self._key(username))
+        if rows is None:
+            return None
+
+        for row in rows:
+            if row[2] == username:
+                return row
+        return rows[0]
+
+    def invalidate(self, guildid):
+        self._version += 1
+        self._guilds.pop(guildid)
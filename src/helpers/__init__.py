@@ -18,7 +18,13 @@ limitations under the License.
 '''
 
 from .guildsettings import GuildSettings
+from .settingsstore import (SettingsStore,
+                            guild_settings_store,
+                            flush_guild_settings)
+from .guildarchive import GuildExporter, GuildRestorer
 from .quotemanager import QuoteManager
+from .quoteimporter import QuoteImporter, import_format, read_quotes
+from .quotesearch import QuoteIndex, QuoteSearch
 from .audiomanager import AudioManager
 from .audioplayer import AudioPlayer
 
@@ -27,6 +33,12 @@ __all__ = [
 
     # Classes
     'AudioManager', 'AudioPlayer',
-    'GuildSettings',
-    'QuoteManager'
+    'GuildExporter', 'GuildRestorer',
+    'GuildSettings', 'SettingsStore',
+    'QuoteManager', 'QuoteImporter',
+    'QuoteIndex', 'QuoteSearch',
+
+    # Methods
+    'guild_settings_store', 'flush_guild_settings',
+    'import_format', 'read_quotes'
     ]
@@ -17,18 +17,22 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from .audioplayer import AudioPlayer, FileSource
-from .guildsettings import GuildSettings
+from .audioplayer import AudioPlayer, create_quote_source
+from .settingsstore import guild_settings_store
 from ..database import hermes_database
+from ..tts import TTSError, TTSJob, guild_engine, tts_worker
 
 from ..utils import (get_full_info, get_quick_info,
                      resolve_video_urls, smart_print)
 from functools import partial
 
+import asyncio
 import itertools
-import random
 import discord
 
+# Seconds `.pq` waits for a quote's audio to be made
+WANT_TIMEOUT = 30
+
 
 class AudioManager:
     """Class used to manage all bots.
@@ -56,14 +60,10 @@ class AudioManager:
             player = self.players[ctx.guild.id]
         except KeyError:
 
-            db_settings = await self.db_manager.get_guild_settings(ctx.guild.id)  # noqa
-
-            if len(db_settings) > 0:
-                db_settings = db_settings[0]
-                guild_settings = GuildSettings(
-                    db_settings[1], db_settings[2], db_settings[3])
-            else:
-                guild_settings = GuildSettings()
+            # Shared with the settings store so volume changes
+            # reach the player straight away.
+            store = guild_settings_store()
+            guild_settings = await store.get(ctx.guild.id)
 
             player = AudioPlayer(ctx, guild_settings)
             self.players[ctx.guild.id] = player
@@ -90,24 +90,21 @@ class AudioManager:
 
     async def on_bot_join_channel(self, ctx, guild):
 
-        quotes = await self.db_manager.get_guild_tts(guild.id)
+        quote = await self.db_manager.get_random_guild_tts(guild.id)
 
-        if(len(quotes) == 0):
+        if(quote is None):
             return
 
-        id = random.randrange(0, len(quotes))
-
         # Get the channel we are playing in
         player = await self._get_player(ctx)
 
         print('Time to play a quote!')
-        print(quotes[id])
+        print(quote)
 
-        quote = quotes[id]
         filename = quote[1]
 
         # Add the random quote to the queue
-        await player.queue.put(FileSource.create_source(ctx, filename))
+        await player.queue.put(create_quote_source(ctx, filename))
 
     async def clear_audio_player(self, guild):
         """
@@ -215,15 +212,44 @@ class AudioManager:
         quote = await self.db_manager.get_id_tts(id)
 
         if len(quote) == 0:
-            return await smart_print(ctx, 'No quote with the provided ID found.')  # noqa
+            return await self._play_wanted(ctx, id)
 
-        # TODO: Fix an issue when a quote with no TTSD is attempted to be TTS'd
         quote = quote[0]
         print(quote)
 
         # Get the channel we are playing in
         player = await self._get_player(ctx)
-        await player.queue.put(FileSource.create_source(ctx, quote[1]))
+        await player.queue.put(create_quote_source(ctx, quote[1]))
+
+    async def _play_wanted(self, ctx, id):
+        """
+        Play a quote whose audio has not been made yet.  It is moved
+        ahead of any other TTS work and played once it is ready.
+        """
+        quote = await self.db_manager.get_quote_from_id(ctx.guild.id, id)
+        worker = tts_worker()
+
+        if len(quote) == 0:
+            return await smart_print(ctx, 'No quote with the provided ID found.')  # noqa
+        if worker is None:
+            return await smart_print(ctx, 'The audio for this quote is not ready yet.')  # noqa
+
+        quote = quote[0]
+        settings = await guild_settings_store().get(ctx.guild.id)
+        job = TTSJob(quote[0], quote[4],
+                     guild_engine(settings.get_tts_engine()), ctx.guild.id)
+
+        await smart_print(ctx, 'The audio for this quote is being made.  It will play when ready.')  # noqa
+        try:
+            filename = await asyncio.wait_for(
+                asyncio.wrap_future(worker.want(job)), WANT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return await smart_print(ctx, 'The audio for this quote is taking too long.  Try again later.')  # noqa
+        except TTSError:
+            return await smart_print(ctx, 'The audio for this quote could not be made.')  # noqa
+
+        player = await self._get_player(ctx)
+        await player.queue.put(create_quote_source(ctx, filename))
 
     async def pause(self, ctx):
         """
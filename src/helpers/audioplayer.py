@@ -26,6 +26,8 @@ import asyncio
 
 from async_timeout import timeout
 from functools import partial
+from ..tts.ttscache import opus_path
+from ..tts.ttsopus import has_opus, opus_gain, opus_packets
 from ..utils import CustomQueue, get_full_info, smart_print
 
 
@@ -47,6 +49,84 @@ class FileSource(discord.PCMVolumeTransformer):
         return cls(discord.FFmpegPCMAudio(data['filename']), data=data, requester=ctx.author)  # noqa
 
 
+class OpusFileSource(discord.AudioSource):
+    """
+    Plays a TTS file's pre-encoded Opus clips.
+
+    Packets are read from the clip and sent as they are, so there is
+    no FFmpeg process and no Opus encoding while a quote plays.
+    Volume picks the clip encoded at the nearest gain.
+    """
+
+    def __init__(self, name, *, data, requester):
+        self.requester = requester
+        self.name = name
+        self.filename = data.get('filename')
+        self.title = data.get('title')
+
+        self._gain = None
+        self._stream = None
+        self._packets = None
+
+        # Gain of the clip which is open.  Volume is set from the
+        # event loop while discord reads on its audio thread, so the
+        # clip is only swapped by `read()`.
+        self._opened = None
+
+        # Packets sent, so a volume change resumes at the same
+        # place in the clip at the new gain.
+        self._sent = 0
+
+    def __getitem__(self, item: str):
+        return self.__getattribute__(item)
+
+    @property
+    def volume(self):
+        return (self._gain or 100) / 100
+
+    @volume.setter
+    def volume(self, value):
+        self._gain = opus_gain(value)
+
+    def _open(self):
+        self.cleanup()
+        self._opened = self._gain
+        self._stream = open(opus_path(self.name, self._opened or 100), 'rb')
+        self._packets = opus_packets(self._stream)
+
+        for _ in range(self._sent):
+            next(self._packets, None)
+
+    def read(self):
+        if self._stream is None or self._opened != self._gain:
+            self._open()
+
+        packet = next(self._packets, b'')
+        if packet:
+            self._sent += 1
+        return packet
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+def create_quote_source(ctx, filename: str):
+    """
+    Source for a TTS file.  Files without Opus clips, such as those
+    made before clips were encoded, are played through FFmpeg.
+    """
+    if not has_opus(filename):
+        return FileSource.create_source(ctx, filename)
+
+    data = {'filename': opus_path(filename, 100), 'title': filename}
+    return OpusFileSource(filename, data=data, requester=ctx.author)
+
+
 class YTDLSource(discord.PCMVolumeTransformer):
     """
     This class creates a live stream AudioSource.
@@ -155,7 +235,7 @@ class AudioPlayer:
                     return self.destroy(self._guild)
 
                 # Check if this is from youtube
-                if not isinstance(source, FileSource):
+                if not isinstance(source, (FileSource, OpusFileSource)):
                     try:
                         # Attempt to create the music audio stream.
                         source = await YTDLSource.regather_stream(source, loop=self.bot.loop)  # noqa
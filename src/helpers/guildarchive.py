@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2021 Oliver Clarke.
+
+This file is part of HermesBot.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from ..database import DatabaseQuery
+from ..tts.ttscache import audio_name, audio_path, reuse_audio
+from ..tts.ttsengine import GTTSEngine
+from ..tts.ttsopus import ensure_opus
+from functools import partial
+
+import asyncio
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import time
+
+# Bumped whenever the layout of an archive changes.  Version 1 named
+# audio by quote id, version 2 by the TTS file's content address.
+ARCHIVE_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+
+# Quotes per chunk, which bounds the memory used on either side
+CHUNK_SIZE = 1000
+
+# Audio is copied in blocks of this many bytes
+COPY_SIZE = 64 * 1024
+
+# Names from an archive become file names, so nothing else is allowed
+_AUDIO_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = time.time()
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _jsonl(records):
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                   for record in records).encode('utf-8')
+
+
+def archive_mode(path, write):
+    """
+    Archives ending in `.gz` are compressed.  Both modes stream, so
+    a member is never seeked back to.
+    """
+    if write:
+        return 'w|gz' if path.endswith('.gz') else 'w|'
+    return 'r|*'
+
+
+class GuildExporter:
+    """
+    Writes a guild's settings, users, quotes and TTS files to a tar
+    archive.
+
+    The archive holds `guild.json` and `users.jsonl`, then each
+    chunk of quotes as `quotes/<n>.jsonl` followed by the audio of
+    those quotes as `audio/<file_name>.mp3`.  Quotes are streamed from
+    the database a chunk at a time, so memory use does not grow with
+    the size of the guild.
+    """
+
+    def __init__(self, db, guildid, chunk_size=CHUNK_SIZE):
+        self.db = db
+        self.guildid = guildid
+        self.chunk_size = chunk_size
+
+        self.users = 0
+        self.quotes = 0
+        self.audio = 0
+        self._chunks = 0
+
+    def __str__(self):
+        return (f'{self.users} users, {self.quotes} quotes and '
+                f'{self.audio} TTS files exported')
+
+    async def run(self, path):
+        users = await self.db.get_guild_users(self.guildid)
+        settings = await self.db.get_guild_settings(self.guildid)
+
+        guild = {
+            'version': ARCHIVE_VERSION,
+            'guild': self.guildid,
+            'exported': datetime.datetime.utcnow().isoformat(),
+            'settings': list(settings[0][1:]) if len(settings) > 0 else None,
+        }
+
+        with tarfile.open(path, archive_mode(path, True)) as tar:
+            _add_bytes(tar, 'guild.json', json.dumps(guild).encode('utf-8'))
+            _add_bytes(tar, 'users.jsonl', _jsonl(
+                {'id': user[0], 'name': user[2]} for user in users))
+            self.users = len(users)
+
+            await self.db.stream(
+                DatabaseQuery.SELECT_EXPORT_QUOTES,
+                (self.guildid,),
+                partial(self._write_chunk, tar),
+                size=self.chunk_size
+            )
+        return self
+
+    def _write_chunk(self, tar, rows):
+        """
+        Runs on the database executor.
+        """
+        records = []
+
+        # Quotes with the same text share a file, which is only
+        # written once per chunk.
+        audio = {}
+
+        for idquote, iduser, quote, date, filename in rows:
+            if filename is not None:
+                path = audio_path(filename)
+                if os.path.isfile(path):
+                    audio[filename] = path
+                else:
+                    filename = None
+
+            records.append({'id': idquote, 'user': iduser, 'quote': quote,
+                            'date': str(date), 'tts': filename})
+
+        _add_bytes(tar, f'quotes/{self._chunks:06d}.jsonl', _jsonl(records))
+        self._chunks += 1
+        self.quotes += len(records)
+
+        # `add()` copies each file through in blocks
+        for filename, path in audio.items():
+            tar.add(path, arcname=f'audio/{filename}.mp3')
+        self.audio += len(audio)
+
+
+class GuildRestorer:
+    """
+    Loads an archive written by `GuildExporter()` into a guild.
+
+    Users are matched by name and created when missing.  Quotes get
+    new ids, so the archive is read in order and only the audio of
+    the current chunk is mapped to its quotes.  Audio which already
+    exists here is not copied again.
+    """
+
+    def __init__(self, db, guildid):
+        self.db = db
+        self.guildid = guildid
+
+        # `(volumem, volumeq, playlist, tts_engine)` from the archive,
+        # if any
+        self.settings = None
+
+        self.users = 0
+        self.quotes = 0
+        self.audio = 0
+        self.skipped = 0
+
+        self.version = None
+        self._user_ids = {}
+
+        # Audio member name to `(file name, [new quote id])`
+        self._audio = {}
+        self._files = []
+
+    def __str__(self):
+        return (f'{self.quotes} quotes, {self.audio} TTS files and '
+                f'{self.users} new users restored, {self.skipped} skipped')
+
+    async def run(self, path):
+        loop = asyncio.get_running_loop()
+        tar = await loop.run_in_executor(
+            None, tarfile.open, path, archive_mode(path, False))
+
+        try:
+            while True:
+                member = await loop.run_in_executor(None, tar.next)
+                if member is None:
+                    break
+                if not member.isfile():
+                    continue
+
+                name = member.name
+                if name.startswith('audio/'):
+                    await loop.run_in_executor(
+                        None, self._restore_audio, tar, member)
+                    continue
+
+                data = await loop.run_in_executor(
+                    None, self._read_member, tar, member)
+
+                if name == 'guild.json':
+                    await self._restore_guild(json.loads(data))
+                elif name == 'users.jsonl':
+                    await self._restore_users(self._records(data))
+                elif name.startswith('quotes/'):
+                    await self._store_files()
+                    await self._restore_quotes(self._records(data))
+
+            await self._store_files()
+        finally:
+            tar.close()
+        return self
+
+    @staticmethod
+    def _read_member(tar, member):
+        with tar.extractfile(member) as stream:
+            return stream.read().decode('utf-8')
+
+    @staticmethod
+    def _records(data):
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    async def _restore_guild(self, guild):
+        self.version = guild.get('version')
+        if self.version not in READABLE_VERSIONS:
+            raise ValueError(f'unsupported archive version {self.version}')
+
+        if guild.get('settings') is not None:
+            # Archives from before guilds chose a TTS engine
+            # have three settings.
+            settings = tuple(guild['settings'])
+            self.settings = (settings + (None,))[:4]
+            await self.db.save_guild_settings(
+                [(self.guildid,) + self.settings])
+
+    async def _restore_users(self, records):
+        names = [record['name'] for record in records]
+        found = await self.db.find_guild_users(self.guildid, names)
+
+        # Users whose names only differ by case were exported
+        # separately, so they are created separately.
+        missing = [name for name, user in found.items() if user is None]
+
+        # The directory is loaded again once after the insert
+        if len(missing) > 0:
+            await self.db.add_guild_users(self.guildid, missing)
+            self.users += len(missing)
+            found = await self.db.find_guild_users(self.guildid, names)
+
+        for record in records:
+            self._user_ids[record['id']] = found[record['name']][0]
+
+    async def _restore_quotes(self, records):
+        rows = []
+        restored = []
+
+        for record in records:
+            userid = self._user_ids.get(record['user'])
+            if userid is None:
+                self.skipped += 1
+                continue
+
+            rows.append((self.guildid, userid, record['quote'],
+                         record['date']))
+            restored.append(record)
+
+        ids = await self.db.add_user_quotes(rows, ids=True)
+        self.quotes += len(ids)
+
+        # Only the chunk whose audio follows is remembered
+        self._audio = {}
+        for record, quoteid in zip(restored, ids):
+            if not record.get('tts'):
+                continue
+
+            # Version 1 audio was made by gTTS and named by quote id
+            if self.version == 1:
+                member = str(record['id'])
+                filename = audio_name(record['quote'],
+                                      *GTTSEngine().key())
+            else:
+                member = filename = record['tts']
+
+            self._audio.setdefault(member, (filename, []))[1].append(quoteid)
+
+    def _restore_audio(self, tar, member):
+        """
+        Runs on the default executor.
+        """
+        stem = os.path.splitext(os.path.basename(member.name))[0]
+        audio = self._audio.get(stem)
+
+        if audio is None or not _AUDIO_NAME.match(audio[0]):
+            self.skipped += 1
+            return
+
+        filename, quoteids = audio
+        if not reuse_audio(filename):
+            path = audio_path(filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Copied under a temporary name, like a synthesized file
+            with tar.extractfile(member) as source, \
+                    open(f'{path}.restore.tmp', 'wb') as target:
+                shutil.copyfileobj(source, target, COPY_SIZE)
+            os.replace(f'{path}.restore.tmp', path)
+
+        # Archives only carry the MP3
+        ensure_opus(filename)
+
+        self._files.extend((quoteid, filename) for quoteid in quoteids)
+
+    async def _store_files(self):
+        if len(self._files) == 0:
+            return
+
+        files, self._files = self._files, []
+        await self.db.add_tts_files(files)
+        self.audio += len(files)
@@ -1,29 +1,15 @@
-from ..database import hermes_database
-
-
 class GuildSettings:
 
-    def __init__(self, svolume=None, qvolume=None, playlist=None):
+    def __init__(self, svolume=None, qvolume=None, playlist=None,
+                 tts_engine=None):
 
         # Define default guild settings
         self._svolume = .05 if not svolume else svolume
         self._qvolume = 0.2 if not qvolume else qvolume
         self._playlist = playlist
 
-    @classmethod
-    async def save_music_volume(self, guildid, volume):
-        db = hermes_database()
-        await db.save_song_volume(guildid, volume)
-
-    @classmethod
-    async def save_quote_volume(self, guildid, volume):
-        db = hermes_database()
-        await db.save_quote_volume(guildid, volume)
-
-    @classmethod
-    async def save_playlist(self, guildid, playlist):
-        db = hermes_database()
-        await db.save_playlist(guildid, playlist)
+        # `None` uses the deployment's TTS engine
+        self._tts_engine = tts_engine
 
     def get_music_volume(self):
         return self._svolume
@@ -33,3 +19,18 @@ class GuildSettings:
 
     def get_playlist(self):
         return self._playlist
+
+    def get_tts_engine(self):
+        return self._tts_engine
+
+    def set_music_volume(self, volume):
+        self._svolume = volume
+
+    def set_quote_volume(self, volume):
+        self._qvolume = volume
+
+    def set_playlist(self, playlist):
+        self._playlist = playlist
+
+    def set_tts_engine(self, engine):
+        self._tts_engine = engine
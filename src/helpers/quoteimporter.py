@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2021 Oliver Clarke.
+
+This file is part of HermesBot.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import csv
+import datetime
+import json
+import os
+import time
+
+BATCH_SIZE = 1000
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def import_format(filename):
+    """
+    Work out the format of an import file from its extension.
+
+    :return: `'csv'` or `'jsonl'`
+    """
+    extension = os.path.splitext(filename)[1].lower()
+
+    if extension == '.csv':
+        return 'csv'
+    elif extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f'Unsupported import file: {filename}')
+
+
+def _is_header(row):
+    names = [column.strip().lower() for column in row[:2]]
+    return names == ['name', 'quote']
+
+
+def read_quotes(stream, fmt):
+    """
+    Stream quotes from a file one record at a time.
+
+    A csv file holds `name,quote[,date]` rows and may start with a
+    header.  A jsonl file holds one `{"name", "quote", "date"}`
+    object per line.  The date is optional in both.
+
+    :return: generator of `(name, quote, date)`
+    """
+    if fmt == 'csv':
+        for row in csv.reader(stream):
+            if len(row) == 0:
+                continue
+
+            # Skip the header if there is one
+            if _is_header(row):
+                continue
+
+            date = row[2] if len(row) > 2 else None
+            yield row[0], row[1] if len(row) > 1 else None, date
+
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+
+            item = json.loads(line)
+            yield item.get('name'), item.get('quote'), item.get('date')
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+class QuoteImporter:
+    """
+    Bulk loads quotes into a guild.
+
+    Records are consumed in batches.  Users missing from the guild
+    are created with one batched insert and the quotes of the batch
+    are written with a second.
+    """
+
+    def __init__(self, db, guildid, batch_size=BATCH_SIZE, progress=None):
+        self.db = db
+        self.guildid = guildid
+        self.batch_size = batch_size
+        self.progress = progress
+
+        self.quotes = 0
+        self.users = 0
+        self.skipped = 0
+        self._started = None
+
+    def __str__(self):
+        return (f'{self.quotes} quotes and {self.users} new users imported, '
+                f'{self.skipped} skipped ({self.rate():.0f} quotes/s)')
+
+    def elapsed(self):
+        if self._started is None:
+            return 0
+        return time.monotonic() - self._started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.quotes / elapsed if elapsed > 0 else 0
+
+    def _format_date(self, date):
+        if not date:
+            return datetime.datetime.utcnow().strftime(DATE_FORMAT)
+
+        # Dates with an offset are stored in UTC like the others
+        date = datetime.datetime.fromisoformat(date)
+        if date.tzinfo is not None:
+            date = date.astimezone(datetime.timezone.utc)
+        return date.strftime(DATE_FORMAT)
+
+    async def run(self, records):
+        """
+        Import every record.
+
+        :param records: iterable of `(name, quote, date)`
+        """
+        self._started = time.monotonic()
+        batch = []
+
+        for record in records:
+            batch.append(record)
+
+            if len(batch) >= self.batch_size:
+                await self._import_batch(batch)
+                batch = []
+
+        if len(batch) > 0:
+            await self._import_batch(batch)
+        return self
+
+    async def _import_batch(self, batch):
+        rows = []
+
+        for name, quote, date in batch:
+            name = name.strip() if name else ''
+            quote = quote.strip() if quote else ''
+
+            try:
+                date = self._format_date(date)
+            except (TypeError, ValueError):
+                self.skipped += 1
+                continue
+
+            if not name or not quote:
+                self.skipped += 1
+                continue
+            rows.append((name, quote, date))
+
+        # Create every missing user at once
+        missing = {}
+        for name, _, _ in rows:
+            user = await self.db.find_guild_user(self.guildid, name)
+            if user is None:
+                missing.setdefault(name.casefold(), name)
+
+        if len(missing) > 0:
+            await self.db.add_guild_users(self.guildid, missing.values())
+            self.users += len(missing)
+
+        quotes = []
+        for name, quote, date in rows:
+            user = await self.db.find_guild_user(self.guildid, name)
+            quotes.append((self.guildid, user[0], quote, date))
+
+        if len(quotes) > 0:
+            await self.db.add_user_quotes(quotes)
+            self.quotes += len(quotes)
+
+        if self.progress is not None:
+            await self.progress(self)
@@ -1,10 +1,25 @@
 from ..database import hermes_database
 from ..utils import smart_print, PageEmbedManager
+from .guildarchive import GuildExporter, GuildRestorer
+from .quoteimporter import QuoteImporter, import_format, read_quotes
+from .settingsstore import guild_settings_store
+from .quotesearch import QuoteSearch
 
 from ..tts import tts_init, shutdown_worker
-from ..tts import TTSJob
+from ..tts import TTSJob, ENGINES, guild_engine
 
+import datetime
 import discord
+import io
+import os
+import tempfile
+import time
+
+# Largest file the bot uploads, in bytes
+UPLOAD_LIMIT = 8 * 1024 * 1024
+
+# Exports too large to upload are kept here
+EXPORT_PATH = 'exports'
 
 
 class QuoteManager:
@@ -14,24 +29,13 @@ class QuoteManager:
         self.bot = bot
         self.db = hermes_database()
         self.em = PageEmbedManager()
+        self.search = QuoteSearch(self.db)
 
         self.tts_manager = tts_init()
 
     def __del__(self):
         shutdown_worker()
 
-    def _contains_user(self, list, username):
-        """
-        Method for checking if a list contains a username.
-        This is useful for checking if the database
-        contains a user.
-        :return: `user`
-        """
-        for user in list:
-            if user[2].lower() == username.lower():
-                return user
-        return None
-
     async def get_guild_users(self, ctx):
         """
         Method for displaying all the users in a guild.
@@ -53,8 +57,7 @@ class QuoteManager:
             return await smart_print(ctx, 'Command missing arguments. Use .help for additional information.')  # noqa
 
         # Lets see if the name already exists
-        users = await self.db.get_guild_users(ctx.guild.id)
-        user = self._contains_user(users, username)
+        user = await self.db.find_guild_user(ctx.guild.id, username)
 
         # This name does exist!  Oh no
         if(user):
@@ -73,15 +76,16 @@ class QuoteManager:
             return await smart_print(ctx, 'Command missing arguments. Use .help for additional information.')  # noqa
 
         # Lets see if the name already exists
-        users = await self.db.get_guild_users(ctx.guild.id)
-
-        user = self._contains_user(users, username)
+        user = await self.db.find_guild_user(ctx.guild.id, username)
         if(not user):
             # This name does exist!  Oh no
             return await smart_print(ctx, 'This name is not in the database.')
 
         # What do you do here!
         await self.db.remove_guild_user(ctx.guild.id, user[0])
+
+        # Their quotes drop out of the guild's listings
+        self.search.invalidate(ctx.guild.id)
         await smart_print(ctx, 'The user **%s** has been deleted.',
                           data=[user[2]])
 
@@ -89,8 +93,7 @@ class QuoteManager:
         """
         Method for adding a new user quote.
         """
-        users = await self.db.get_guild_users(ctx.guild.id)
-        user = self._contains_user(users, name)
+        user = await self.db.find_guild_user(ctx.guild.id, name)
 
         # We only add a quote if the user exsists
         if(not user):
@@ -104,16 +107,152 @@ class QuoteManager:
             quote_id = await self.db.add_user_quote(ctx.guild.id, user[0], args)
             await smart_print(ctx, 'Added quote for the user **%s**. %s',  # noqa
                               data=[user[2], quote_id])
+            self.search.add(ctx.guild.id, quote_id, user[2], args)
+
+            settings = await guild_settings_store().get(ctx.guild.id)
+            job = TTSJob(quote_id, args,
+                         guild_engine(settings.get_tts_engine()),
+                         ctx.guild.id)
 
-            filename = f'{quote_id}_{ctx.guild.id}_{user[0]}'
-            job = TTSJob(quote_id, args, filename)
-            self.tts_manager.add_job(job)
+            # Made ahead of any backfill so `.pq` can play it soon
+            self.tts_manager.add_job(job, interactive=True)
 
         except Exception:
             await smart_print(ctx, 'Unable to create due to an unknown error.')
 
         # job = TTSJob(args, f'{user[0]}_{ctx.guild.id}_{}')
 
+    async def import_quotes(self, ctx):
+        """
+        Method for bulk importing the quotes in an attached
+        csv or jsonl file.
+        """
+        if len(ctx.message.attachments) == 0:
+            return await smart_print(ctx, 'Attach a .csv or .jsonl file of quotes to import.')  # noqa
+
+        attachment = ctx.message.attachments[0]
+
+        try:
+            fmt = import_format(attachment.filename)
+        except ValueError:
+            return await smart_print(ctx, 'Only .csv and .jsonl files can be imported.')  # noqa
+
+        data = await attachment.read()
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8',
+                                  newline='')
+
+        message = await ctx.send('> Importing quotes.  Please Wait.')
+        last_update = time.monotonic()
+
+        async def progress(importer):
+            nonlocal last_update
+
+            # Stay well clear of the message edit rate limit
+            if time.monotonic() - last_update < 2:
+                return
+            last_update = time.monotonic()
+            await message.edit(content=f'> Importing: {importer}')
+
+        importer = QuoteImporter(self.db, ctx.guild.id, progress=progress)
+
+        try:
+            await importer.run(read_quotes(stream, fmt))
+        except (ValueError, UnicodeDecodeError) as e:
+            await message.edit(content=f'> Import stopped: {importer}')
+            return await smart_print(ctx, 'The import file is invalid: %s',
+                                     data=[e])
+        finally:
+            # Create the TTS files for whatever was imported
+            self.tts_manager.request_backfill()
+            self.search.invalidate(ctx.guild.id)
+
+        await message.edit(content=f'> Import finished: {importer}')
+
+    async def export_quotes(self, ctx):
+        """
+        Method for exporting a guild's users, quotes and TTS files
+        as an archive which `restore` can load.
+        """
+        os.makedirs(EXPORT_PATH, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        filename = f'{ctx.guild.id}-{stamp}.tar.gz'
+        path = os.path.join(EXPORT_PATH, filename)
+
+        message = await ctx.send('> Exporting quotes.  Please Wait.')
+        exporter = await GuildExporter(self.db, ctx.guild.id).run(path)
+        await message.edit(content=f'> Export finished: {exporter}')
+
+        if os.path.getsize(path) > UPLOAD_LIMIT:
+            return await smart_print(ctx, 'The export is too large to upload.  It has been saved as **%s** for the bot owner.',  # noqa
+                                     data=[path])
+
+        await ctx.send(file=discord.File(path, filename))
+        os.remove(path)
+
+    async def restore_quotes(self, ctx):
+        """
+        Method for restoring an attached export into the guild.
+        """
+        if len(ctx.message.attachments) == 0:
+            return await smart_print(ctx, 'Attach an exported archive to restore.')  # noqa
+
+        attachment = ctx.message.attachments[0]
+        message = await ctx.send('> Restoring quotes.  Please Wait.')
+
+        descriptor, path = tempfile.mkstemp(suffix='.tar.gz')
+        os.close(descriptor)
+        restorer = GuildRestorer(self.db, ctx.guild.id)
+
+        try:
+            await attachment.save(path)
+            await restorer.run(path)
+        except (ValueError, KeyError, OSError) as e:
+            await message.edit(content=f'> Restore stopped: {restorer}')
+            return await smart_print(ctx, 'The archive is invalid: %s',
+                                     data=[e])
+        finally:
+            os.remove(path)
+
+            # Create the TTS files the archive did not have
+            self.tts_manager.request_backfill()
+            self.search.invalidate(ctx.guild.id)
+
+        # Keep the bot's cached settings in line with the database
+        if restorer.settings is not None:
+            store = guild_settings_store()
+            music, quote, playlist, engine = restorer.settings
+            await store.set_music_volume(ctx.guild.id, music)
+            await store.set_quote_volume(ctx.guild.id, quote)
+            await store.set_playlist(ctx.guild.id, playlist)
+            await store.set_tts_engine(ctx.guild.id, engine)
+
+        await message.edit(content=f'> Restore finished: {restorer}')
+
+    async def set_tts_engine(self, ctx, name):
+        """
+        Method for showing or choosing the engine a guild's quotes
+        are spoken with.  Existing audio is kept; only new quotes
+        use the new engine.
+        """
+        store = guild_settings_store()
+
+        if name is None:
+            settings = await store.get(ctx.guild.id)
+            return await smart_print(ctx, 'Quotes are spoken with **%s**. Engines: %s',  # noqa
+                                     data=[guild_engine(settings.get_tts_engine()),  # noqa
+                                           ', '.join(ENGINES)])
+
+        name = name.lower()
+        if name == 'default':
+            name = None
+        elif name not in ENGINES:
+            return await smart_print(ctx, 'Unknown TTS engine **%s**. Engines: %s',  # noqa
+                                     data=[name, ', '.join(ENGINES)])
+
+        await store.set_tts_engine(ctx.guild.id, name)
+        await smart_print(ctx, 'New quotes will be spoken with **%s**.',
+                          data=[guild_engine(name)])
+
     async def remove_user_quote(self, ctx, quoteid):
 
         quote = await self.db.get_quote_from_id(ctx.guild.id, quoteid)
@@ -123,6 +262,7 @@ class QuoteManager:
                                      data=[quoteid])
 
         await self.db.remove_user_quote(ctx.guild.id, quoteid)
+        self.search.remove(ctx.guild.id, quote[0][0])
         await smart_print(ctx, 'Quote removed successfully.')
 
     async def get_user_quotes(self, ctx, username):
@@ -130,11 +270,8 @@ class QuoteManager:
         Method for retreiving all quotes a user in a guild has said.
         """
 
-        # First, we need to get all the users
-
-        users = await self.db.get_guild_users(ctx.guild.id)
-
-        user = self._contains_user(users, username)
+        # First, we need to find the user
+        user = await self.db.find_guild_user(ctx.guild.id, username)
         if(not user):
             return await smart_print(ctx, 'The user **%s** is not in the database.',  # noqa
                                      data=[username])
@@ -179,27 +316,93 @@ class QuoteManager:
 
     async def get_all_guild_quotes(self, ctx):
         """
-        Method for retreving all the quotes in a guild.
+        Method for retreving all the quotes in a guild.  Only the
+        page being viewed is fetched from the database.
         """
-        # First, we need to get all the users
-        all_quotes = await self.db.get_guild_quotes(ctx.guild.id)
+        guildid = ctx.guild.id
+        total = await self.db.get_guild_quote_count(guildid)
 
-        if len(all_quotes) == 0:
+        if total == 0:
             return await smart_print(ctx, 'There are currently **0** quotes.')
 
+        async def fetch_after(quoteid, limit):
+            return await self.db.get_guild_quotes_after(guildid, quoteid, limit)  # noqa
+
+        async def fetch_before(quoteid, limit):
+            return await self.db.get_guild_quotes_before(guildid, quoteid, limit)  # noqa
+
+        embed = self.em.CreateKeysetEmbed(
+            title='All Quotes',
+            fetch_after=fetch_after,
+            fetch_before=fetch_before,
+            total=total,
+            to_item=lambda q: [f'{q[2]} - {q[0]}', q[4]],
+            description=f'There is a total of **{total}** quotes',
+            color=discord.Colour.dark_teal(),
+            inline=False
+            )
+        await embed.load()
+        await self.em.send(ctx, embed)
+
+    async def search_quotes(self, ctx, text):
+        """
+        Method for finding the quotes in a guild which best
+        match a search.
+        """
+        results = await self.search.search(ctx.guild.id, text)
+
+        if len(results) == 0:
+            return await smart_print(ctx, 'No quotes match **%s**.',
+                                     data=[text])
+
         quotes = []
-        for q in all_quotes:
-            quotes.append([f'{q[2]} - {q[0]}', q[4]])
+        for _, quoteid, username, quote in results:
+            quotes.append([f'{username} - {quoteid}', quote])
 
         embed = self.em.CreateEmbed(
-            title='All Quotes',
-            description=f'There is a total of **{len(quotes)}** quotes',
+            title=f'Quotes matching "{text}"',
+            description=f'Showing the best **{len(quotes)}** matches',
             color=discord.Colour.dark_teal(),
             inline=False
             )
         embed.add_items(quotes)
         await self.em.send(ctx, embed)
 
+    async def get_quote_stats(self, ctx):
+        """
+        Method for showing how many quotes each user in a guild has,
+        overall and this month.
+        """
+        guildid = ctx.guild.id
+        month = datetime.datetime.utcnow().strftime('%Y-%m')
+
+        users = await self.db.get_quote_stats(guildid)
+        monthly = await self.db.get_month_quote_stats(guildid, month)
+
+        if len(users) == 0:
+            return await smart_print(ctx, 'There are no quotes in this server yet.')  # noqa
+
+        total = sum(count for _, count in users)
+        embed = discord.Embed(
+            title='Quote stats',
+            color=discord.Colour.dark_teal(),
+            description=(f'**{total}** quotes from **{len(users)}** users, '
+                         f'**{sum(count for _, count in monthly)}** '
+                         f'this month'))
+
+        embed.add_field(
+            name='Most quoted',
+            value='\n'.join(f'{username}: **{count}**'
+                            for username, count in users[:10]))
+
+        if len(monthly) > 0:
+            embed.add_field(
+                name='Most quoted this month',
+                value='\n'.join(f'{username}: **{count}**'
+                                for username, count in monthly[:10]))
+
+        await ctx.send(embed=embed)
+
     async def on_emote_update(self, reaction, user):
         """
         Method called when an user reacts to a message.  This handles
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2021 Oliver Clarke.
+
+This file is part of HermesBot.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from ..database.cache import LRUCache
+from functools import partial
+
+import asyncio
+import math
+import re
+
+# Rows fetched per query while an index is built
+BUILD_PAGE_SIZE = 1000
+
+# BM25 tuning
+K1 = 1.2
+B = 0.75
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN.findall(text.casefold())
+
+
+class QuoteIndex:
+    """
+    Inverted index over the quotes of one guild.
+
+    Each term maps to the quotes containing it and how often it
+    appears in each.  Results are ranked with BM25.
+    """
+
+    def __init__(self):
+        self.quotes = {}    # {quoteid: (username, text)}
+        self.lengths = {}   # {quoteid: number of terms}
+        self.postings = {}  # {term: {quoteid: count}}
+        self.total_length = 0
+
+        # Quotes removed while the index was being built, which the
+        # build must not add back.
+        self.building = True
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.quotes)
+
+    def add(self, quoteid, username, text):
+        if self.building and quoteid in self.removed:
+            return
+
+        # Re-adding a quote replaces it
+        self._discard(quoteid)
+
+        terms = tokenize(text)
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[quoteid] = count
+
+        self.quotes[quoteid] = (username, text)
+        self.lengths[quoteid] = len(terms)
+        self.total_length += len(terms)
+
+    def remove(self, quoteid):
+        if self.building:
+            self.removed.add(quoteid)
+
+        self._discard(quoteid)
+
+    def _discard(self, quoteid):
+        quote = self.quotes.pop(quoteid, None)
+        if quote is None:
+            return
+
+        for term in set(tokenize(quote[1])):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(quoteid, None)
+                if len(posting) == 0:
+                    del self.postings[term]
+
+        self.total_length -= self.lengths.pop(quoteid)
+
+    def search(self, text, limit=100):
+        """
+        :return: `[(score, quoteid, username, quote)]`, best first
+        """
+        count = len(self.quotes)
+        if count == 0:
+            return []
+
+        average = self.total_length / count
+        scores = {}
+
+        for term in set(tokenize(text)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+
+            idf = math.log(1 + (count - len(posting) + 0.5)
+                           / (len(posting) + 0.5))
+
+            for quoteid, frequency in posting.items():
+                norm = K1 * (1 - B + B * self.lengths[quoteid] / average)
+                score = idf * frequency * (K1 + 1) / (frequency + norm)
+                scores[quoteid] = scores.get(quoteid, 0) + score
+
+        best = sorted(scores.items(), key=lambda s: (-s[1], s[0]))[:limit]
+        return [(score, quoteid) + self.quotes[quoteid]
+                for quoteid, score in best]
+
+
+class QuoteSearch:
+    """
+    Search indexes for the guilds which have been searched recently.
+
+    A guild's index is built from the database on its first search
+    and then kept up to date as quotes are added and removed.
+    """
+
+    def __init__(self, db, max_guilds=32):
+        self.db = db
+        self._indexes = LRUCache(max_guilds)
+        self._building = {}
+
+    async def _build(self, guildid, index):
+        quoteid = None
+
+        while True:
+            rows = await self.db.get_guild_quotes_after(
+                guildid, quoteid, BUILD_PAGE_SIZE)
+
+            for row in rows:
+                index.add(row[0], row[2], row[4])
+
+            if len(rows) < BUILD_PAGE_SIZE:
+                break
+            quoteid = rows[-1][0]
+
+        index.building = False
+        index.removed.clear()
+        return index
+
+    def _built(self, guildid, task):
+        # A build cancelled by `invalidate()` may finish after
+        # the next one has started.
+        if self._building.get(guildid) is task:
+            del self._building[guildid]
+
+    async def get_index(self, guildid):
+        while True:
+            index = self._indexes.get(guildid)
+            if index is not None and not index.building:
+                return index
+
+            # Only one build per guild, anyone else waits for it
+            task = self._building.get(guildid)
+            if task is None:
+                index = QuoteIndex()
+
+                # Stored now so changes made during the build reach it
+                self._indexes.put(guildid, index)
+                task = asyncio.ensure_future(self._build(guildid, index))
+                self._building[guildid] = task
+                task.add_done_callback(partial(self._built, guildid))
+
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Invalidated during the build, so wait for a new one
+                if not task.cancelled():
+                    raise
+            except Exception:
+                self.invalidate(guildid)
+                raise
+
+    async def search(self, guildid, text, limit=100):
+        index = await self.get_index(guildid)
+        return index.search(text, limit)
+
+    def add(self, guildid, quoteid, username, text):
+        index = self._indexes.get(guildid)
+        if index is not None:
+            index.add(quoteid, username, text)
+
+    def remove(self, guildid, quoteid):
+        index = self._indexes.get(guildid)
+        if index is not None:
+            index.remove(quoteid)
+
+    def invalidate(self, guildid):
+        """Drop a guild's index after changes it cannot follow."""
+        task = self._building.pop(guildid, None)
+        if task is not None:
+            task.cancel()
+        self._indexes.pop(guildid)
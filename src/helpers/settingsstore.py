@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright (c) 2021 Oliver Clarke.
+
+This file is part of HermesBot.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from .guildsettings import GuildSettings
+from ..database import hermes_database
+
+from collections import OrderedDict
+
+import asyncio
+import weakref
+
+# Seconds to wait after a change before it is written out.
+FLUSH_INTERVAL = 5
+
+# Guilds whose settings are kept once nothing else holds them
+MAX_GUILDS = 1024
+
+
+class SettingsStore:
+    """
+    Write-behind store for guild settings.
+
+    Every guild has a single `GuildSettings()` object which is
+    shared with its `AudioPlayer()`, so a change is seen straight
+    away.  Changed guilds are marked dirty and written to the
+    database together, at most once per `flush_interval`, as one
+    multi-row upsert.
+
+    The `max_guilds` most recently used guilds are kept.  Older ones
+    are only forgotten once they are written out and no player holds
+    them, so a guild never has two settings objects.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL,
+                 max_guilds=MAX_GUILDS):
+        self.db = hermes_database()
+        self.flush_interval = flush_interval
+        self.max_guilds = max_guilds
+
+        # Recently used guilds, least recently used first
+        self._settings = OrderedDict()
+
+        # Every settings object still in use, such as by a player
+        self._shared = weakref.WeakValueDictionary()
+
+        self._dirty = set()
+        self._flushing = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+
+    def _lookup(self, guildid):
+        settings = self._settings.get(guildid)
+        if settings is None:
+            settings = self._shared.get(guildid)
+
+        if settings is not None:
+            self._keep(guildid, settings)
+        return settings
+
+    def _keep(self, guildid, settings):
+        self._settings[guildid] = settings
+        self._settings.move_to_end(guildid)
+        self._shared[guildid] = settings
+
+        # Changes which have not been written out are never dropped
+        if len(self._settings) > self.max_guilds:
+            for old in list(self._settings):
+                if len(self._settings) <= self.max_guilds:
+                    break
+                if old not in self._dirty and old not in self._flushing:
+                    del self._settings[old]
+
+    async def get(self, guildid):
+        """
+        Get the settings for a guild, loading them from the
+        database the first time the guild is seen.
+
+        :return: `GuildSettings()`
+        """
+        settings = self._lookup(guildid)
+        if settings is not None:
+            return settings
+
+        db_settings = await self.db.get_guild_settings(guildid)
+
+        # Another task may have loaded the guild while we waited
+        settings = self._lookup(guildid)
+        if settings is not None:
+            return settings
+
+        if len(db_settings) > 0:
+            db_settings = db_settings[0]
+            settings = GuildSettings(
+                db_settings[1], db_settings[2], db_settings[3],
+                db_settings[4])
+        else:
+            settings = GuildSettings()
+
+        self._keep(guildid, settings)
+        return settings
+
+    async def set_music_volume(self, guildid, volume):
+        settings = await self.get(guildid)
+        settings.set_music_volume(volume)
+        self._mark_dirty(guildid)
+
+    async def set_quote_volume(self, guildid, volume):
+        settings = await self.get(guildid)
+        settings.set_quote_volume(volume)
+        self._mark_dirty(guildid)
+
+    async def set_playlist(self, guildid, playlist):
+        settings = await self.get(guildid)
+        settings.set_playlist(playlist)
+        self._mark_dirty(guildid)
+
+    async def set_tts_engine(self, guildid, engine):
+        settings = await self.get(guildid)
+        settings.set_tts_engine(engine)
+        self._mark_dirty(guildid)
+
+    def _mark_dirty(self, guildid):
+        self._dirty.add(guildid)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        # A flush is already waiting and will pick this change up,
+        # and once closing the last flush is the one in `close()`.
+        if self._flush_task is not None or self._closed:
+            return
+
+        loop = asyncio.get_running_loop()
+        self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+
+        # Changes made from here on need a flush of their own
+        self._flush_task = None
+
+        # Shielded so a shutdown does not abandon a write mid-way
+        await asyncio.shield(self.flush())
+
+    async def flush(self):
+        """
+        Write every changed guild to the database.
+        """
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            dirty, self._dirty = self._dirty, set()
+            self._flushing = dirty
+            rows = []
+
+            for guildid in dirty:
+                settings = self._settings[guildid]
+                rows.append((guildid,
+                             settings.get_music_volume(),
+                             settings.get_quote_volume(),
+                             settings.get_playlist() or '',
+                             settings.get_tts_engine()))
+            try:
+                await self.db.save_guild_settings(rows)
+            except Exception as e:
+                # Keep the changes so a later flush tries again
+                print(f'Unable to save guild settings: {e}')
+                self._dirty.update(dirty)
+                self._schedule_flush()
+            finally:
+                self._flushing = set()
+
+    async def close(self):
+        """
+        Cancel any waiting flush and write out pending changes.
+        """
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+_STORE_HOLDER = {'store': None}
+
+
+def guild_settings_store():
+    if _STORE_HOLDER['store'] is None:
+        _STORE_HOLDER['store'] = SettingsStore()
+    return _STORE_HOLDER['store']
+
+
+async def flush_guild_settings():
+    """
+    Write out any pending settings.  Called when the bot shuts down.
+    """
+    store = _STORE_HOLDER['store']
+
+    if store is not None:
+        await store.close()
@@ -20,6 +20,8 @@ limitations under the License.
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from .helpers import flush_guild_settings
+
 import discord
 import os
 
@@ -42,6 +44,11 @@ class HermesClient(commands.Bot):
 
         print("Bot is ready!")
 
+    async def close(self):
+        """Write out pending guild settings before disconnecting."""
+        await flush_guild_settings()
+        await super().close()
+
     def register_cogs(self):
         """Register the discord bot cogs"""
         for file in os.listdir('./src/cogs'):
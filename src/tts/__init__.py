@@ -1,31 +1,59 @@
 from .ttsthread import TTSThread
+from ..database import hermes_database
 from .ttsjob import TTSJob
+from .ratelimiter import RateLimiter
+from .ttsscheduler import TTSScheduler
+from .ttscache import audio_name, cleanup_audio
+from .ttschunk import split_text, join_audio
+from .ttsopus import encode_opus, ensure_opus, opus_gain
+from .ttsengine import (TTSEngine, GTTSEngine, EspeakEngine, ENGINES,
+                        tts_engine, guild_engine)
 from .ttserror import (TTSError,
                        TTSNetworkError,
                        TTSFileError,
-                       TTSDatabaseError)
+                       TTSDatabaseError,
+                       TTSEngineError)
 
 _TTS_HOLDER = {'tts': None}
 
 
 def tts_init():
     if _TTS_HOLDER['tts'] is None:
-        _TTS_HOLDER['tts'] = TTSThread()
+        _TTS_HOLDER['tts'] = TTSThread(hermes_database())
 
     return _TTS_HOLDER['tts']
 
 
+def tts_worker():
+    """
+    :return: The running `TTSThread()`, or `None` before `tts_init()`
+    """
+    return _TTS_HOLDER['tts']
+
+
 def shutdown_worker():
     if _TTS_HOLDER['tts'] is not None:
         _TTS_HOLDER['tts'].is_running = False
 
+        # Let the worker store its finished references
+        # before the database is closed.
+        if _TTS_HOLDER['tts'].is_alive():
+            _TTS_HOLDER['tts'].join(timeout=10)
+
 
 __all__ = [
     # Classes
-    'TTSJob',
+    'TTSJob', 'TTSThread', 'TTSScheduler', 'RateLimiter',
+    'TTSEngine', 'GTTSEngine', 'EspeakEngine',
     'TTSError', 'TTSNetworkError',
-    'TTSFileError', 'TTSDatabaseError',
+    'TTSFileError', 'TTSDatabaseError', 'TTSEngineError',
+
+    # Variables
+    'ENGINES',
 
     # Methods
-    'tts_init', 'shutdown_worker'
+    'tts_init', 'tts_worker', 'shutdown_worker',
+    'audio_name', 'cleanup_audio', 'split_text', 'join_audio',
+    'tts_engine', 'guild_engine',
+    'encode_opus', 'ensure_opus', 'opus_gain'
 ]
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` acquisitions a second, with bursts
+    of up to `burst`.  A rate of 0 or less disables the limit.
+
+    Only used from the event loop which awaits `acquire()`.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self.rate)
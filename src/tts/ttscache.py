@@ -0,0 +1,125 @@
+import hashlib
+import os
+import re
+import time
+import unicodedata
+
+TTS_PATH = 'tts_files'
+
+# Unreferenced files younger than this, in seconds, are kept since
+# a job may be about to store a reference to them.
+CLEANUP_GRACE = 60 * 60
+
+# Names are checked against the database this many at a time
+CLEANUP_BATCH = 500
+
+# Quote volumes, in percent, which every clip is pre-encoded at as
+# Opus.  Playback picks the nearest, so it never has to scale audio.
+OPUS_GAINS = (5, 10, 20, 35, 50, 75, 100)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """
+    Text which is spoken the same way gets the same audio.
+    """
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def audio_name(text, engine, lang, voice):
+    """
+    Content address of a TTS file.  Quotes with the same text,
+    spoken by the same engine and voice, share one file.
+
+    :return: File name without the directory or extension
+    """
+    key = '\0'.join((engine, lang, voice, normalize_text(text)))
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def audio_path(name):
+    return os.path.join(TTS_PATH, f'{name}.mp3')
+
+
+def opus_path(name, gain):
+    return os.path.join(TTS_PATH, f'{name}.{gain}.opus')
+
+
+def reuse_audio(name):
+    """
+    Claim an existing TTS file.  Its modification time is reset so
+    a cleanup running at the same time leaves it alone.
+
+    :return: `True` if the file exists
+    """
+    try:
+        os.utime(audio_path(name))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+async def cleanup_audio(db, grace=CLEANUP_GRACE, dry_run=False):
+    """
+    Remove TTS files which no quote references any more.  Files are
+    checked in batches, so the directory is never held in memory.
+
+    :return: `(files removed, bytes freed)`
+    """
+    removed = 0
+    freed = 0
+    cutoff = time.time() - grace
+
+    async def check(candidates):
+        nonlocal removed, freed
+
+        referenced = await db.get_referenced_tts_files(list(candidates))
+        for name, entry in candidates.items():
+            if name in referenced:
+                continue
+
+            # Checked again, since a quote added during the lookup
+            # may have claimed the file with `reuse_audio()`.
+            try:
+                stat = os.stat(entry.path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+
+            removed += 1
+            freed += stat.st_size
+            if not dry_run:
+                os.remove(entry.path)
+
+            # Along with the file's Opus clips
+            for gain in OPUS_GAINS:
+                try:
+                    stat = os.stat(opus_path(name, gain))
+                    if stat.st_mtime > cutoff:
+                        continue
+
+                    freed += stat.st_size
+                    if not dry_run:
+                        os.remove(opus_path(name, gain))
+                except FileNotFoundError:
+                    pass
+
+    candidates = {}
+    with os.scandir(TTS_PATH) as entries:
+        for entry in entries:
+            name, extension = os.path.splitext(entry.name)
+            if extension != '.mp3' or not entry.is_file():
+                continue
+            if entry.stat().st_mtime > cutoff:
+                continue
+
+            candidates[name] = entry
+            if len(candidates) >= CLEANUP_BATCH:
+                await check(candidates)
+                candidates = {}
+
+    if len(candidates) > 0:
+        await check(candidates)
+    return removed, freed
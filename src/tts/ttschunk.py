@@ -0,0 +1,80 @@
+from .ttscache import audio_path, normalize_text
+from .ttsengine import LOCAL_TIMEOUT
+from .ttserror import TTSEngineError
+
+import os
+import re
+import subprocess
+
+# Longer text is synthesized in chunks of at most this many
+# characters.  gTTS makes a request for every 100 characters itself,
+# but one after another.
+CHUNK_LENGTH = 100
+
+# Places text is split, tried in order: sentences, then phrases,
+# then words.  A single word longer than a chunk is kept whole.
+_BOUNDARIES = (
+    re.compile(r'(?<=[.!?])\s+'),
+    re.compile(r'(?<=[,;:])\s+'),
+    re.compile(r'\s+'),
+)
+
+
+def _split(text, limit, boundaries):
+    if len(text) <= limit or len(boundaries) == 0:
+        return [text]
+
+    pieces = []
+    for part in boundaries[0].split(text):
+        pieces.extend(_split(part, limit, boundaries[1:]))
+
+    # Neighbouring pieces share a chunk while they fit
+    chunks = []
+    for piece in pieces:
+        if len(chunks) > 0 and len(chunks[-1]) + len(piece) < limit:
+            chunks[-1] = f'{chunks[-1]} {piece}'
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def split_text(text, limit=CHUNK_LENGTH):
+    """
+    Split text to be spoken at the most natural boundaries which keep
+    every chunk within `limit` characters.  The same text is always
+    split the same way, so chunks are cached like any other audio.
+
+    :return: List of chunks, just the text when it is short enough
+    """
+    return _split(normalize_text(text), limit, _BOUNDARIES)
+
+
+def join_audio(names, path):
+    """
+    Join TTS files end to end into one MP3 with FFmpeg, without
+    encoding them again.  Blocks, so it is only called from an
+    executor.
+
+    :param names: Names of the files in the order they are spoken
+    """
+    listing = f'{path}.txt'
+    try:
+        with open(listing, 'w') as f:
+            for name in names:
+                f.write(f"file '{os.path.abspath(audio_path(name))}'\n")
+
+        result = subprocess.run(
+            ['ffmpeg', '-loglevel', 'error', '-y', '-f', 'concat',
+             '-safe', '0', '-i', listing, '-c', 'copy', '-f', 'mp3', path],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE, timeout=LOCAL_TIMEOUT)
+        if result.returncode != 0:
+            raise TTSEngineError(
+                f'ffmpeg exited with {result.returncode}: '
+                f'{result.stderr.decode().strip()}')
+
+    except (OSError, subprocess.SubprocessError) as e:
+        raise TTSEngineError(e)
+    finally:
+        if os.path.exists(listing):
+            os.remove(listing)
@@ -0,0 +1,171 @@
+from dotenv import load_dotenv
+
+from .ttserror import TTSEngineError, TTSNetworkError
+
+import os
+import subprocess
+import threading
+
+# Seconds a local engine may take over one file
+LOCAL_TIMEOUT = 60
+
+
+class TTSEngine:
+    """
+    Turns text into an MP3 file.
+
+    `synthesize()` blocks and is only called from the TTS executor.
+    The engine's name, language and voice are part of the content
+    address of every file it makes.
+    """
+
+    name = None
+
+    def __init__(self, lang, voice):
+        self.lang = lang
+        self.voice = voice
+
+    def __str__(self):
+        return f'{self.name} ({self.lang}, {self.voice})'
+
+    def key(self):
+        """
+        :return: `(engine, lang, voice)` for `audio_name()`
+        """
+        return (self.name, self.lang, self.voice)
+
+    def synthesize(self, text, path):
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    """
+    Google Translate's TTS service.  Every file is a network request.
+    The voice is the Google domain used, which sets the accent.
+    """
+
+    name = 'gtts'
+
+    def __init__(self, lang='en', voice='com'):
+        super().__init__(lang, voice)
+
+    def synthesize(self, text, path):
+        # Imported here so deployments using a local engine
+        # do not need gTTS installed.
+        from gtts import gTTS
+
+        try:
+            gTTS(text, lang=self.lang, tld=self.voice).save(path)
+        except Exception as e:
+            raise TTSNetworkError(e)
+
+
+class EspeakEngine(TTSEngine):
+    """
+    Offline synthesis with espeak-ng, run as a subprocess.  Its WAV
+    output is piped through FFmpeg, which the bot already needs for
+    playback, to make an MP3.  The voice is an espeak voice name and
+    `lang` is only recorded.
+    """
+
+    name = 'espeak'
+
+    def __init__(self, lang='en', voice='en', command='espeak-ng'):
+        super().__init__(lang, voice)
+        self.command = command
+
+    def synthesize(self, text, path):
+        try:
+            # Text goes in on stdin so it is never read as an option
+            speak = subprocess.Popen(
+                [self.command, '-v', self.voice, '--stdin', '--stdout'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL)
+            encode = subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-y',
+                 '-i', 'pipe:0', '-f', 'mp3', path],
+                stdin=speak.stdout, stderr=subprocess.PIPE)
+
+            # Only FFmpeg reads espeak's output from here on
+            speak.stdout.close()
+            speak.stdin.write(text.encode('utf-8'))
+            speak.stdin.close()
+
+            try:
+                _, errors = encode.communicate(timeout=LOCAL_TIMEOUT)
+                speak.wait(timeout=LOCAL_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                encode.kill()
+                speak.kill()
+                raise
+
+        except (OSError, subprocess.SubprocessError) as e:
+            raise TTSEngineError(e)
+
+        if speak.returncode != 0 or encode.returncode != 0:
+            raise TTSEngineError(
+                f'{self.command} exited with {speak.returncode}, ffmpeg '
+                f'with {encode.returncode}: {errors.decode().strip()}')
+
+
+ENGINES = {
+    GTTSEngine.name: GTTSEngine,
+    EspeakEngine.name: EspeakEngine,
+}
+
+_ENGINE_HOLDER = {}
+_ENGINE_LOCK = threading.Lock()
+
+
+def _create_default():
+    load_dotenv()
+
+    name = os.getenv('TTS_ENGINE', GTTSEngine.name).lower()
+    if name not in ENGINES:
+        raise Exception(f'Unknown TTS engine: {name}')
+
+    kwargs = {}
+    if os.getenv('TTS_LANG'):
+        kwargs['lang'] = os.getenv('TTS_LANG')
+    if os.getenv('TTS_VOICE'):
+        kwargs['voice'] = os.getenv('TTS_VOICE')
+    if name == EspeakEngine.name and os.getenv('TTS_ESPEAK'):
+        kwargs['command'] = os.getenv('TTS_ESPEAK')
+
+    return ENGINES[name](**kwargs)
+
+
+def tts_engine(name=None):
+    """
+    The TTS engine named `name`, or the deployment's engine set by
+    `TTS_ENGINE`, `TTS_LANG` and `TTS_VOICE` when `name` is `None`
+    or names the same engine.  Engines are created once and shared.
+
+    :return: `TTSEngine()`
+    """
+    with _ENGINE_LOCK:
+        if None not in _ENGINE_HOLDER:
+            _ENGINE_HOLDER[None] = _create_default()
+
+        default = _ENGINE_HOLDER[None]
+        if name is None or name == default.name:
+            return default
+
+        if name not in ENGINES:
+            raise Exception(f'Unknown TTS engine: {name}')
+
+        if name not in _ENGINE_HOLDER:
+            _ENGINE_HOLDER[name] = ENGINES[name]()
+        return _ENGINE_HOLDER[name]
+
+
+def guild_engine(name):
+    """
+    The engine a guild chose by name.  Guilds which chose none, or an
+    engine this deployment does not have, use the deployment's.
+
+    :return: `TTSEngine()`
+    """
+    if name is not None and name in ENGINES:
+        return tts_engine(name)
+    return tts_engine()
@@ -22,3 +22,8 @@ class TTSFileError(TTSError):
 class TTSDatabaseError(TTSError):
     def __str__(self):
         return f'TTSDatabaseError: {self.message} -> {self.error}'
+
+
+class TTSEngineError(TTSError):
+    def __str__(self):
+        return f'TTSEngineError: {self.message} -> {self.error}'
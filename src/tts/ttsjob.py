@@ -1,55 +1,105 @@
-from .ttserror import TTSNetworkError, TTSFileError, TTSDatabaseError
-from gtts import gTTS
+from .ttscache import audio_name, audio_path, reuse_audio
+from .ttschunk import join_audio, split_text
+from .ttsengine import tts_engine
+from .ttserror import TTSError, TTSFileError
+from .ttsopus import ensure_opus
+
+import os
+import threading
 
 
 class TTSJob():
     """
     This class handles the creation of tts objects.
+
+    Files are named by a hash of what is spoken and how, so a quote
+    whose audio already exists reuses it without synthesis.
     """
 
-    def __init__(self, quoteid, text, filename):
+    def __init__(self, quoteid, text, engine=None, guildid=None):
         self.id = quoteid
         self.text = text
-        self.filename = filename
-        self.full_name = f'tts_files/{self.filename}.mp3'
+
+        # Guilds take turns in the scheduler
+        self.guildid = guildid
+
+        # The deployment's engine unless the guild chose another
+        self.engine = engine if engine is not None else tts_engine()
+
+        self.filename = audio_name(text, *self.engine.key())
+        self.full_name = audio_path(self.filename)
+
+        # `(text, file name)` of each chunk a long quote is made from,
+        # empty when it is synthesized in one go.  Chunks are files
+        # of their own, so they are shared and survive a failure.
+        chunks = split_text(text)
+        self.chunks = []
+        if len(chunks) > 1:
+            self.chunks = [(chunk, audio_name(chunk, *self.engine.key()))
+                           for chunk in chunks]
+
+        # Set by `synthesize()` when an existing file was used
+        self.reused = False
+
+        # Failed runs so far, kept in the job's journal row
+        self.attempts = 0
 
     def __str__(self):
         return f'Job: {self.id}-{self.filename} -> "{self.text}"'
 
-    def _create_engine(self):
+    def _write(self, path, write):
         """
-        Create the TTS object
+        Call `write` with a temporary name which is then moved to
+        `path`, so a partial file is never mistaken for finished
+        audio.
         """
+        temp_name = f'{path}.{threading.get_ident()}.tmp'
         try:
-            tts = gTTS(self.text, lang='en', tld='com')
+            write(temp_name)
+            os.replace(temp_name, path)
+        except TTSError:
+            raise
         except Exception as e:
-            raise TTSNetworkError(e)
-        return tts
+            raise TTSFileError(e)
+        finally:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
 
-    def _save_file(self, tts):
+    def save_chunk(self, text, name):
         """
-        This method saves a TTS object as a file
+        Synthesize one chunk of a long quote, unless it exists.
+        Blocks, so it is only called from an executor.
         """
-        try:
-            tts.save(self.full_name)
-        except Exception as e:
-            raise TTSFileError(e)
-
-    async def _store_in_database(self, database):
-
-        await database.add_tts_file(self.id, self.filename)
-        try:
-            pass
-        except Exception as e:
-            raise TTSDatabaseError(e)
+        if not reuse_audio(name):
+            self._write(audio_path(name),
+                        lambda path: self.engine.synthesize(text, path))
 
-    async def task(self, database):
+    def _save_file(self):
+        """
+        This method has the engine write the TTS file.  A long
+        quote is joined from its chunks, made one after another
+        here unless they were made beforehand.
+        """
+        if len(self.chunks) == 0:
+            self._write(self.full_name,
+                        lambda path: self.engine.synthesize(self.text, path))
+            return
 
-        # Create the engine
-        tts = self._create_engine()
+        for text, name in self.chunks:
+            self.save_chunk(text, name)
+        self._write(self.full_name,
+                    lambda path: join_audio(
+                        [name for _, name in self.chunks], path))
 
-        # Store the file
-        self._save_file(tts)
+    def synthesize(self):
+        """
+        Create the TTS file without storing its reference.
+        """
+        if reuse_audio(self.filename):
+            self.reused = True
+        else:
+            # Store the file
+            self._save_file()
 
-        # Store the file in the database
-        await self._store_in_database(database)
+        # Pre-encode the clips played in voice channels
+        ensure_opus(self.filename)
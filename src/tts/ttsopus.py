@@ -0,0 +1,144 @@
+from dotenv import load_dotenv
+
+from .ttscache import OPUS_GAINS, audio_path, opus_path
+from .ttsengine import LOCAL_TIMEOUT
+from .ttserror import TTSEngineError
+
+import math
+import os
+import struct
+import subprocess
+import threading
+
+# Discord plays 20ms stereo frames at 48kHz
+OPUS_BITRATE = '64k'
+FRAME_DURATION = 20
+
+_PAGE_HEADER = struct.Struct('<4sBBqIIIB')
+_HEADER_PACKETS = (b'OpusHead', b'OpusTags')
+
+_OPUS_HOLDER = {'enabled': None}
+
+
+def opus_enabled():
+    """
+    Clips are encoded unless `TTS_OPUS` is set to `0`, for FFmpeg
+    builds without libopus.
+    """
+    if _OPUS_HOLDER['enabled'] is None:
+        load_dotenv()
+        _OPUS_HOLDER['enabled'] = os.getenv('TTS_OPUS', '1') != '0'
+    return _OPUS_HOLDER['enabled']
+
+
+def has_opus(name):
+    """
+    :return: `True` if every gain of a clip has been encoded
+    """
+    return all(os.path.isfile(opus_path(name, gain)) for gain in OPUS_GAINS)
+
+
+def opus_gain(volume):
+    """
+    The encoded gain nearest to a volume, compared as a ratio since
+    that is how loudness is heard.
+
+    :param volume: Volume from `0` to `1`
+    :return: A gain from `OPUS_GAINS`
+    """
+    volume = max(volume * 100, OPUS_GAINS[0])
+    return min(OPUS_GAINS, key=lambda gain: abs(math.log(gain / volume)))
+
+
+def encode_opus(name):
+    """
+    Encode a TTS file as an Ogg Opus clip at every gain with a single
+    FFmpeg run.  Blocks, so it is only called from an executor.
+    """
+    temp = {gain: f'{opus_path(name, gain)}.{threading.get_ident()}.tmp'
+            for gain in OPUS_GAINS}
+
+    split = ''.join(f'[s{i}]' for i in range(len(OPUS_GAINS)))
+    graph = [f'[0:a]asplit={len(OPUS_GAINS)}{split}']
+    graph.extend(f'[s{i}]volume={gain / 100}[o{i}]'
+                 for i, gain in enumerate(OPUS_GAINS))
+
+    command = ['ffmpeg', '-loglevel', 'error', '-y', '-i', audio_path(name),
+               '-filter_complex', ';'.join(graph)]
+    for i, gain in enumerate(OPUS_GAINS):
+        command.extend([
+            '-map', f'[o{i}]', '-c:a', 'libopus', '-b:a', OPUS_BITRATE,
+            '-frame_duration', str(FRAME_DURATION), '-ar', '48000',
+            '-ac', '2', '-f', 'ogg', temp[gain]])
+
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE,
+                                timeout=LOCAL_TIMEOUT)
+        if result.returncode != 0:
+            raise TTSEngineError(
+                f'ffmpeg exited with {result.returncode}: '
+                f'{result.stderr.decode().strip()}')
+
+        for gain in OPUS_GAINS:
+            os.replace(temp[gain], opus_path(name, gain))
+
+    except (OSError, subprocess.SubprocessError) as e:
+        raise TTSEngineError(e)
+    finally:
+        for path in temp.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def ensure_opus(name):
+    """
+    Encode a clip's missing Opus gains.  The MP3 is still played
+    through FFmpeg if this fails, so it only warns.
+
+    :return: `True` if the clip has Opus gains
+    """
+    if not opus_enabled():
+        return False
+    if has_opus(name):
+        return True
+
+    try:
+        encode_opus(name)
+        return True
+    except TTSEngineError as e:
+        print(f'Unable to encode Opus clips for {name}: {e}')
+        return False
+
+
+def opus_packets(stream):
+    """
+    Generator which yields the Opus packets of an Ogg stream, without
+    the header packets, ready to be sent to Discord as they are.
+    """
+    packet = b''
+
+    while True:
+        header = stream.read(_PAGE_HEADER.size)
+        if len(header) < _PAGE_HEADER.size:
+            return
+
+        magic, _, _, _, _, _, _, segments = _PAGE_HEADER.unpack(header)
+        if magic != b'OggS':
+            raise ValueError('not an Ogg stream')
+
+        # A lacing value under 255 ends a packet, which may
+        # otherwise carry on into the next page.
+        lacing = stream.read(segments)
+        data = stream.read(sum(lacing))
+        offset = 0
+
+        for size in lacing:
+            packet += data[offset:offset + size]
+            offset += size
+
+            if size < 255:
+                if not packet.startswith(_HEADER_PACKETS):
+                    yield packet
+                packet = b''
@@ -0,0 +1,116 @@
+from collections import OrderedDict, deque
+
+import asyncio
+
+# Lanes, in the order they are served
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class TTSScheduler:
+    """
+    Queue of TTS jobs with an interactive and a background lane.
+
+    Interactive jobs, such as a quote someone just added, are always
+    taken before background work, so their wait does not depend on
+    the size of a backfill.  Within a lane guilds take turns, so one
+    guild's import cannot hold up another's.
+
+    Only used from the TTS thread's event loop.
+    """
+
+    def __init__(self):
+        # Each lane maps guild id to its jobs, in the order
+        # the guilds take their turns.
+        self._lanes = (OrderedDict(), OrderedDict())
+        self._sizes = [0, 0]
+
+        # Quote id to the `(lane, job)` it is queued as.  A job
+        # moved to another lane leaves a stale entry behind,
+        # which is skipped when it is reached.
+        self._queued = {}
+
+        self._ready = asyncio.Event()
+
+    def qsize(self, lane=None):
+        if lane is None:
+            return sum(self._sizes)
+        return self._sizes[lane]
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def __contains__(self, quoteid):
+        return quoteid in self._queued
+
+    def put(self, job, lane=BACKGROUND):
+        current = self._queued.get(job.id)
+        if current is not None:
+            if lane < current[0]:
+                self.boost(job.id)
+            return
+
+        self._push(job, lane)
+        self._ready.set()
+
+    def boost(self, quoteid):
+        """
+        Move a queued job to the interactive lane.
+
+        :return: `True` if the job was waiting in the background
+        """
+        current = self._queued.get(quoteid)
+        if current is None or current[0] == INTERACTIVE:
+            return False
+
+        lane, job = current
+        self._sizes[lane] -= 1
+        self._push(job, INTERACTIVE)
+        return True
+
+    def _push(self, job, lane):
+        self._lanes[lane].setdefault(job.guildid, deque()).append(job)
+        self._queued[job.id] = (lane, job)
+        self._sizes[lane] += 1
+
+    def _pop(self):
+        for lane, guilds in enumerate(self._lanes):
+            while len(guilds) > 0:
+                guildid, jobs = next(iter(guilds.items()))
+                job = jobs.popleft()
+                stale = self._queued.get(job.id) != (lane, job)
+
+                # The guild goes to the back of the line, unless
+                # the job had moved and it keeps its turn.
+                if len(jobs) == 0:
+                    del guilds[guildid]
+                elif not stale:
+                    guilds.move_to_end(guildid)
+
+                if not stale:
+                    del self._queued[job.id]
+                    self._sizes[lane] -= 1
+                    return job
+        return None
+
+    def get_nowait(self):
+        """
+        :return: The next job, or `None` when there are none
+        """
+        return self._pop()
+
+    async def wait(self):
+        """
+        Wait until there is a job, without taking it.
+        """
+        while self.empty():
+            self._ready.clear()
+            await self._ready.wait()
+
+    async def get(self):
+        while True:
+            await self.wait()
+
+            job = self._pop()
+            if job is not None:
+                return job
@@ -1,30 +1,149 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from .ratelimiter import RateLimiter
+from .ttsengine import guild_engine
 from .ttserror import TTSError
 from .ttsjob import TTSJob
-from ..database import DatabaseManager
+from .ttsscheduler import BACKGROUND, INTERACTIVE, TTSScheduler
 
 import threading
 import asyncio
-import queue
+import datetime
+import os
+import random
+import time
+
+# Finished references are stored together once this many are
+# waiting, or when the oldest has waited this long in seconds.
+STORE_BATCH_SIZE = 25
+STORE_BATCH_WAIT = 2
+
+# Jobs synthesized at once, and the requests a second allowed in
+# total and by each worker.  A rate of 0 is unlimited.
+WORKERS = 4
+RATE = 8
+WORKER_RATE = 2
+
+# Jobs queued or being worked on are capped at `MAX_QUEUED`, loaded
+# from the journal every `JOURNAL_POLL` seconds, or as soon as the
+# queue runs low but no more often than every `JOURNAL_WAKE`.
+MAX_QUEUED = 200
+JOURNAL_POLL = 5
+JOURNAL_WAKE = 0.1
+
+# A backfill queues jobs for this many quotes at a time, for at most
+# `BACKFILL_BUDGET` seconds between loads of the journal.
+BACKFILL_CHUNK = 1000
+BACKFILL_BUDGET = 0.5
+
+# The chunks of a long quote are synthesized at once, on up to
+# `CHUNK_THREADS` threads for each worker.  A failed chunk is tried
+# `CHUNK_ATTEMPTS` times, `CHUNK_RETRY` seconds apart and doubling,
+# before its job fails.
+CHUNK_THREADS = 4
+CHUNK_ATTEMPTS = 3
+CHUNK_RETRY = 1
+
+# A failed job is tried again after `RETRY_BASE` seconds, doubling
+# with each failure up to `RETRY_MAX`, and is given up on after
+# `MAX_ATTEMPTS` tries.
+RETRY_BASE = 30
+RETRY_MAX = 60 * 60
+MAX_ATTEMPTS = 5
 
 
 class TTSThread(threading.Thread):
+    """
+    Runs TTS jobs on a pool of workers.
 
-    def __init__(self):
+    Jobs are queued from any thread with `add_job()`.  Each worker
+    coroutine on the thread's event loop takes jobs in turn and runs
+    the blocking synthesis on its own executor thread, so up to
+    `workers` files are made at once within the rate limits.  The
+    chunks of a long quote are made at the same time and joined.
+
+    Jobs added interactively are made before any backfill, and a
+    quote someone is waiting to play is moved to the front with
+    `want()`.
+
+    Every job has a row in the `tts_jobs` journal until its file is
+    stored, so work survives a restart and is loaded from there
+    rather than found by scanning the quotes.  A job which fails is
+    retried with an exponential backoff and is left as a dead letter
+    after `max_attempts` tries.
+    """
+
+    def __init__(self, database):
 
         # Initialize internal elements
         super().__init__()
 
-        self.queue = queue.Queue()
         self.is_running = True
         self.daemon = True
 
+        load_dotenv()
+        self.workers = int(os.getenv('TTS_WORKERS', WORKERS))
+        self.rate = float(os.getenv('TTS_RATE', RATE))
+        self.worker_rate = float(os.getenv('TTS_WORKER_RATE', WORKER_RATE))
+        self.max_attempts = int(os.getenv('TTS_MAX_ATTEMPTS', MAX_ATTEMPTS))
+        self.max_queued = int(os.getenv('TTS_MAX_QUEUED', MAX_QUEUED))
+
+        # Quote ids which are queued or being worked on
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+        # Set when there may be quotes without a TTS file or a
+        # job, such as after an import
+        self._backfill = threading.Event()
+
+        # The quote id a running backfill continues after
+        self._backfill_after = None
+
+        # When the journal was last read
+        self._polled = None
+
         self._target = self.initialize_loop
 
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
 
-        # Create a new database connection manager
-        self.database = DatabaseManager(self.loop)
+        # Only touched from the thread's loop
+        self.queue = TTSScheduler()
+
+        # Set by the workers when the queue runs low
+        self._wake = asyncio.Event()
+
+        # Quote id to the futures of `want()` calls waiting on it
+        self._waiters = {}
+
+        # Synthesis blocks, so it runs here rather than on the loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers * CHUNK_THREADS,
+            thread_name_prefix='hermes_tts')
+
+        # The bot's database manager, shared rather than
+        # opening a second connection pool.
+        self.database = database
+
+        # File name to the synthesis making it
+        self._synthesizing = {}
+
+        # Jobs the workers are on
+        self._running = set()
+
+        # `(quote_id, file_name)` of synthesized files waiting
+        # for their references to be stored.
+        self._finished = []
+        self._finished_since = None
+
+        # Counters for `stats()`
+        self.in_flight = 0
+        self.synthesized = 0
+        self.reused = 0
+        self.failed = 0
+        self.retried = 0
+        self._created = time.monotonic()
 
         # Start the thread
         self.start()
@@ -32,44 +151,411 @@ class TTSThread(threading.Thread):
     def __del__(self):
         self.is_running = False
 
-    def add_job(self, job):
+    def stats(self):
+        """
+        Queue depth and throughput.  Safe to call from any thread.
+        """
+        elapsed = time.monotonic() - self._created
+        return {
+            'queued': self.queue.qsize(),
+            'queued_interactive': self.queue.qsize(INTERACTIVE),
+            'in_flight': self.in_flight,
+            'waiting_to_store': len(self._finished),
+            'workers': self.workers,
+            'synthesized': self.synthesized,
+            'reused': self.reused,
+            'failed': self.failed,
+            'retried': self.retried,
+            'rate': self.synthesized / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def add_job(self, job, interactive=False):
+        """
+        Queue a job from any thread.  Interactive jobs, for quotes
+        which were just added, are made ahead of the backfill.
+        """
+        lane = INTERACTIVE if interactive else BACKGROUND
+
+        with self._pending_lock:
+            if job.id in self._pending:
+                # Moved up if it is still waiting in the background
+                if interactive:
+                    self.loop.call_soon_threadsafe(self.queue.boost, job.id)
+                return
+            self._pending.add(job.id)
+
+        self.loop.call_soon_threadsafe(self.queue.put, job, lane)
+
+    def want(self, job):
+        """
+        Ask for a quote's audio to be made now, because someone is
+        waiting to play it.  Safe to call from any thread.
+
+        :return: `concurrent.futures.Future()` of the file name
+        """
+        future = Future()
+        self.loop.call_soon_threadsafe(self._want, job, future)
+        return future
+
+    async def _queue_wanted(self, job):
         try:
-            self.queue.put(job, timeout=2)
-        except TimeoutError:
-            print('Adding job to the queue has timedout.')
+            await self.database.add_tts_jobs([job.id], priority=INTERACTIVE)
+        except Exception as e:
+            print(f'Unable to journal TTS job {job.id}: {e}')
 
-    async def _run_task(self):
+        self.queue.put(job, INTERACTIVE)
 
-        missing_tts = await self.database.get_missing_tts()
+    def _want(self, job, future):
+        # Already made and waiting to be stored
+        for quoteid, filename in self._finished:
+            if quoteid == job.id:
+                if not future.done():
+                    future.set_result(filename)
+                return
 
-        if len(missing_tts) > 0:
-            for missing in missing_tts:
-                temp_job = TTSJob(
-                    missing[0],
-                    missing[3],
-                    f'{missing[0]}_{missing[2]}_{missing[1]}'
-                    )
-                self.add_job(temp_job)
+        self._waiters.setdefault(job.id, []).append(future)
 
-        while self.is_running:
+        with self._pending_lock:
+            self._pending.add(job.id)
+
+        # A job a worker is on resolves the waiter when it finishes
+        if job.id in self.queue:
+            self.queue.boost(job.id)
+        elif not self._in_progress(job.id):
+            self.loop.create_task(self._queue_wanted(job))
+
+    def _in_progress(self, quoteid):
+        return any(running.id == quoteid for running in self._running)
+
+    def _resolve(self, job, error=None):
+        for future in self._waiters.pop(job.id, ()):
+            # Given up on by a caller which timed out
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(job.filename)
+
+    def request_backfill(self):
+        """
+        Ask the worker to look for quotes without a TTS file.
+        Used after quotes are added in bulk.
+        """
+        self._backfill.set()
+
+    async def _queue_missing(self):
+        """
+        Queue jobs for the quotes without audio a chunk at a time,
+        keyed by quote id.  Each chunk commits its checkpoint, so a
+        pass over a large library resumes where it stopped.
+        """
+        try:
+            if self._backfill_after is None:
+                self._backfill.clear()
+                self._backfill_after = \
+                    await self.database.start_tts_backfill()
+
+            started = time.monotonic()
+            while (self._backfill_after is not None
+                   and time.monotonic() - started < BACKFILL_BUDGET):
+                queued, self._backfill_after = \
+                    await self.database.queue_missing_tts_jobs(
+                        self._backfill_after, BACKFILL_CHUNK)
+
+                if queued > 0:
+                    self._polled = None
+        except Exception as e:
+            # Carried on from the checkpoint next time round
+            print(f'Unable to queue missing TTS jobs: {e}')
+            return
+
+        if self._backfill_after is None:
+            print('TTS backfill finished.')
+
+    def _should_poll(self):
+        if self._polled is None:
+            return True
+
+        # Once the queue runs low, otherwise now and then for
+        # retries which have come due.
+        waited = time.monotonic() - self._polled
+        return waited >= JOURNAL_POLL or self._wake.is_set()
+
+    async def _wait_for_wake(self):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            return
+
+        if self._polled is not None:
+            waited = time.monotonic() - self._polled
+            await asyncio.sleep(max(JOURNAL_WAKE - waited, 0))
+
+    def _queue_low(self):
+        return self.queue.qsize() < self.max_queued // 2
+
+    async def _load_jobs(self):
+        """
+        Queue the journal's due jobs.  Jobs already queued or being
+        worked on keep their place, and no more than `max_queued` are
+        held however large the journal is.
+        """
+        self._polled = time.monotonic()
+        self._wake.clear()
+
+        # Finished jobs waiting to be stored are still pending, and
+        # still in the journal, but take no room in the queue.
+        room = self.max_queued - self.queue.qsize() - self.in_flight
+        if room <= 0:
+            return
 
-            # Wait for a new job
+        with self._pending_lock:
+            limit = room + len(self._pending)
+
+        try:
+            due = await self.database.get_due_tts_jobs(limit)
+        except Exception as e:
+            print(f'Unable to read the TTS journal: {e}')
+            return
+
+        # Guild id to the engine it chose, looked up once a pass
+        engines = {}
+
+        for quoteid, guildid, text, priority, attempts in due:
+            with self._pending_lock:
+                if quoteid in self._pending:
+                    continue
+
+            if guildid not in engines:
+                settings = await self.database.get_guild_settings(guildid)
+                engines[guildid] = guild_engine(
+                    settings[0][4] if len(settings) > 0 else None)
+
+            job = TTSJob(quoteid, text, engines[guildid], guildid)
+            job.attempts = attempts
+            self.add_job(job, interactive=priority == INTERACTIVE)
+
+            room -= 1
+            if room == 0:
+                break
+
+    async def _retry_later(self, job, error):
+        """
+        Record a failed job in the journal.  It stays pending until
+        then so the journal is not read in between.
+        """
+        attempts = job.attempts + 1
+        dead = attempts >= self.max_attempts
+
+        # Jittered so jobs which failed together do not retry together
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+        delay *= random.uniform(0.5, 1)
+        retry_at = datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=delay)
+
+        if dead:
+            print(f'Giving up on TTS job {job.id} after {attempts} attempts')
+        else:
+            self.retried += 1
+            print(f'Retrying TTS job {job.id} in {delay:.0f}s')
+
+        try:
+            await self.database.retry_tts_job(job.id, attempts, retry_at,
+                                              error, dead)
+        except Exception as e:
+            print(f'Unable to record the failed TTS job {job.id}: {e}')
+        finally:
+            with self._pending_lock:
+                self._pending.discard(job.id)
+
+    async def _store_finished(self):
+        """
+        Store the references of every finished job in one batch.
+        """
+        finished = self._finished
+        self._finished = []
+        self._finished_since = None
+
+        try:
+            await self.database.complete_tts_jobs(finished)
+        except Exception as e:
+            # The jobs are still in the journal and the files
+            # exist, so they are reused when the jobs run again.
+            print(f'Storing TTS files failed: {e}')
+        finally:
+            with self._pending_lock:
+                self._pending.difference_update(
+                    quoteid for quoteid, _ in finished)
+
+    def _should_store(self, idle):
+        if len(self._finished) == 0:
+            return False
+
+        waited = time.monotonic() - self._finished_since
+        return (idle or len(self._finished) >= STORE_BATCH_SIZE
+                or waited >= STORE_BATCH_WAIT)
+
+    async def _shared(self, name, make):
+        """
+        Files with the same name share one synthesis rather than
+        racing to write the same file.
+
+        :return: `True` if another job was already making it
+        """
+        running = self._synthesizing.get(name)
+        if running is not None:
+            await running
+            return True
+
+        running = asyncio.ensure_future(make())
+        self._synthesizing[name] = running
+        try:
+            await running
+        finally:
+            del self._synthesizing[name]
+        return False
+
+    async def _synthesize_chunk(self, job, text, name, limit, rate,
+                                paid=False):
+        """
+        :param limit: The worker's `RateLimiter()`
+        :param rate: The `RateLimiter()` shared by every worker
+        :param paid: `True` for the chunk whose first request is
+                     the one the worker took the job with
+        """
+        for attempt in range(CHUNK_ATTEMPTS):
+            # Every chunk is a request of its own, within both the
+            # worker's limit and the shared one.
+            if attempt > 0 or not paid:
+                await limit.acquire()
+                await rate.acquire()
             try:
-                job = self.queue.get(timeout=1)
-            except Exception:
+                await self.loop.run_in_executor(
+                    self._executor, job.save_chunk, text, name)
+                return
+            except TTSError as e:
+                if attempt == CHUNK_ATTEMPTS - 1:
+                    raise
+                print(f'Retrying a chunk of {job.id}: {e}')
+                await asyncio.sleep(CHUNK_RETRY * 2 ** attempt)
+
+    async def _make_audio(self, job, limit, rate):
+        """
+        Synthesize the chunks of a long quote at the same time, so it
+        takes about as long as its slowest chunk, then join them.
+        """
+        if len(job.chunks) > 0 and not os.path.isfile(job.full_name):
+            results = await asyncio.gather(
+                *(self._shared(name, lambda text=text, name=name, i=i:
+                               self._synthesize_chunk(job, text, name, limit,
+                                                      rate, paid=i == 0))
+                  for i, (text, name) in enumerate(job.chunks)),
+                return_exceptions=True)
+
+            # Chunks which were made are kept for the job's retry
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+
+        await self.loop.run_in_executor(self._executor, job.synthesize)
+
+    async def _synthesize(self, job, limit, rate):
+        if await self._shared(job.filename,
+                              lambda: self._make_audio(job, limit, rate)):
+            job.reused = True
+
+    async def _worker(self, rate):
+        limit = RateLimiter(self.worker_rate)
+
+        while self.is_running:
+            try:
+                await asyncio.wait_for(self.queue.wait(), timeout=1)
+            except asyncio.TimeoutError:
                 continue
 
-            print(temp_job)
+            # The job is only taken once the worker may run it, so
+            # one wanted meanwhile is not stuck behind a throttled
+            # background job.
+            await limit.acquire()
+            await rate.acquire()
 
-            # Perform the job
+            job = self.queue.get_nowait()
+            if job is None:
+                continue
+
+            print(job)
+
+            # Perform the job.  Its id stays pending until the
+            # reference is stored so the journal does not repeat it.
+            self.in_flight += 1
+            self._running.add(job)
             try:
-                await job.task(self.database)
+                await self._synthesize(job, limit, rate)
             except TTSError as e:
                 print(f'Task failed: {e}')
+                self.failed += 1
+                self._resolve(job, e)
+                await self._retry_later(job, e)
+            else:
+                self._resolve(job)
+                if job.reused:
+                    self.reused += 1
+                else:
+                    self.synthesized += 1
+                if self._finished_since is None:
+                    self._finished_since = time.monotonic()
+                self._finished.append((job.id, job.filename))
+            finally:
+                self.in_flight -= 1
+                self._running.discard(job)
+
+            if self._should_store(idle=self.queue.empty()):
+                await self._store_finished()
+
+            if self._queue_low():
+                self._wake.set()
+
+    async def _run_task(self):
+
+        # Carry on with a backfill the last run did not finish
+        try:
+            _, running = await self.database.get_tts_backfill()
+            if running:
+                self._backfill.set()
+        except Exception as e:
+            print(f'Unable to read the TTS backfill checkpoint: {e}')
+
+        # Shared by every worker
+        rate = RateLimiter(self.rate, burst=self.workers)
+        workers = [self.loop.create_task(self._worker(rate))
+                   for _ in range(self.workers)]
+
+        while self.is_running:
+
+            if self._backfill.is_set() or self._backfill_after is not None:
+                await self._queue_missing()
+
+            if self._should_poll():
+                await self._load_jobs()
+
+            await self._wait_for_wake()
+
+            idle = self.queue.empty() and self.in_flight == 0
+            if self._should_store(idle=idle):
+                await self._store_finished()
+
+        # Workers finish the job they are on.  Jobs still queued
+        # stay in the journal for the next start.
+        await asyncio.gather(*workers)
+
+        if len(self._finished) > 0:
+            await self._store_finished()
 
     def initialize_loop(self):
 
         self.loop.run_until_complete(self._run_task())
         self.loop.close()
+        self._executor.shutdown(wait=False)
 
         print('Thread finished.')
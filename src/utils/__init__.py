@@ -17,15 +17,19 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 from .customqueue import CustomQueue
-from .ttsworker import GTTSWorker
+from .ttsworker import TTSWorker, GTTSWorker
 from .messagehandler import smart_print
-from .multipageembed import MultiPageEmbed, PageEmbedManager
+from .multipageembed import (MultiPageEmbed,
+                             KeysetPageEmbed,
+                             PageEmbedManager)
 from .urlresolver import (get_quick_info,
                           get_full_info,
                           resolve_video_urls)
 
 __all__ = ['CustomQueue',
            'GTTSWorker',
+           'TTSWorker',
+           'KeysetPageEmbed',
            'MultiPageEmbed',
            'PageEmbedManager',
            'get_quick_info',
@@ -1,6 +1,8 @@
 # https://gist.github.com/Ristellise/ea025eb01e4542e0f91c7ecab9fb704f
 
+import asyncio
 import discord
+import inspect
 from discord import Colour
 
 
@@ -62,27 +64,58 @@ class PageEmbedManager:
                                )
         return embed
 
+    def CreateKeysetEmbed(self,
+                          title,
+                          fetch_after,
+                          fetch_before,
+                          total,
+                          to_item,
+                          description=None,
+                          footer=None,
+                          inline=True,
+                          color=Colour.dark_teal()):
+        embed = KeysetPageEmbed(title,
+                                fetch_after,
+                                fetch_before,
+                                total,
+                                to_item,
+                                items_per_page=self.item_per_page,
+                                description=description,
+                                footer=footer,
+                                inline=inline,
+                                color=color
+                                )
+        return embed
+
     async def check(self, messageid, emoji):
         for item in self.active_embeds:
             if item['id'] == messageid:
 
                 embed = item['embed']
+                action = None
 
                 if emoji == embed.emojis[0]:
                     print('First page.')
-                    embed.first_page()
+                    action = embed.first_page
                 elif emoji == embed.emojis[1]:
                     print('Previouse page.')
-                    embed.prev_page()
+                    action = embed.prev_page
                 elif emoji == embed.emojis[2]:
                     print('Not deleting yet.')
                     pass  # delete
                 elif emoji == embed.emojis[3]:
                     print('Next page.')
-                    embed.next_page()
+                    action = embed.next_page
                 elif emoji == embed.emojis[4]:
                     print('Last page.')
-                    embed.last_page()
+                    action = embed.last_page
+
+                if action is not None:
+                    result = action()
+
+                    # Keyset embeds fetch the page from the database
+                    if inspect.isawaitable(result):
+                        await result
                 return embed
         return False
 
@@ -162,3 +195,89 @@ class MultiPageEmbed (discord.Embed):
     def last_page(self):
         self.page = self.maxpages
         self.set_chunk()
+
+
+class KeysetPageEmbed(MultiPageEmbed):
+    """
+    A `MultiPageEmbed` which fetches its pages as they are viewed.
+
+    Only the page on screen is held in memory.  Pages are found by
+    keyset pagination, using the key of the first or last item on
+    the current page as the starting point for the next fetch.
+
+    `fetch_after(key, limit)` returns the rows after `key` in
+    ascending order, `key` being `None` for the first page.
+    `fetch_before(key, limit)` returns the rows before `key` in
+    descending order, `key` being `None` for the last page.
+    `to_item(row)` turns a row into a `[name, value]` field.
+    """
+
+    def __init__(self, title, fetch_after, fetch_before, total, to_item,
+                 key=lambda row: row[0], **kwargs):
+        super().__init__(title, **kwargs)
+
+        self.fetch_after = fetch_after
+        self.fetch_before = fetch_before
+        self.to_item = to_item
+        self.key = key
+
+        self.total = total
+        self.maxpages = max(0, (total - 1) // self.items_per_page)
+        self.rows = []
+
+        self._lock = asyncio.Lock()
+
+    def add_items(self, items: list):
+        raise TypeError('KeysetPageEmbed fetches its own items.')
+
+    def set_chunk(self):
+        self.clear_fields()
+
+        for row in self.rows:
+            x = self.to_item(row)
+            self.add_field(name=x[0], value=x[1], inline=self.inline)
+
+        self.set_footer(text=f'Page {self.page+1} of {self.maxpages+1}')
+
+    def _show(self, page, rows):
+        # Quotes may have been removed since the count was taken
+        if len(rows) == 0:
+            return
+
+        self.page = page
+        self.rows = rows
+        self.set_chunk()
+
+    async def load(self):
+        """Fetch the first page.  Call before sending the embed."""
+        await self.first_page()
+
+    async def next_page(self):
+        async with self._lock:
+            if self.page == self.maxpages or len(self.rows) == 0:
+                return
+
+            rows = await self.fetch_after(self.key(self.rows[-1]),
+                                          self.items_per_page)
+            self._show(self.page + 1, rows)
+
+    async def prev_page(self):
+        async with self._lock:
+            if self.page == 0 or len(self.rows) == 0:
+                return
+
+            rows = await self.fetch_before(self.key(self.rows[0]),
+                                           self.items_per_page)
+            self._show(self.page - 1, rows[::-1])
+
+    async def first_page(self):
+        async with self._lock:
+            rows = await self.fetch_after(None, self.items_per_page)
+            self._show(0, rows)
+
+    async def last_page(self):
+        async with self._lock:
+            # The last page holds whatever is left over
+            size = self.total - self.maxpages * self.items_per_page
+            rows = await self.fetch_before(None, size)
+            self._show(self.maxpages, rows[::-1])
@@ -1,12 +1,12 @@
-from gtts import gTTS
+from ..tts.ttsengine import GTTSEngine, tts_engine
 import os
 
 
-class GTTSWorker:
+class TTSWorker:
 
-    def __init__(self, save_directory='temp', lang='en', tld='com.au'):
-        self.lang = lang
-        self.tld = tld
+    def __init__(self, engine=None, save_directory='temp'):
+        # The deployment's engine unless one is given
+        self.engine = engine if engine is not None else tts_engine()
 
         self.save_directory = save_directory
 
@@ -24,18 +24,18 @@ class GTTSWorker:
             cb(tts_data)
             return
 
-        # Create the engine
-        try:
-            tts = gTTS(tts_data['text'], lang=self.lang, tld=self.tld)
-        except Exception as e:
-            tts_data['error'] = e
-
         # Save the TTS file
         try:
-            tts.save(filepath)
+            self.engine.synthesize(tts_data['text'], filepath)
         except Exception as e:
             tts_data['error'] = e
 
         # Call our callback
         if(cb is not None):
             cb(tts_data)
+
+
+class GTTSWorker(TTSWorker):
+
+    def __init__(self, save_directory='temp', lang='en', tld='com.au'):
+        super().__init__(GTTSEngine(lang, tld), save_directory)